@@ -60,27 +60,34 @@ def main(session, files=None, file_list=None, prefix=None, absolute_paths=False)
         # row_dicts = get_row_dicts(item)
 
         st = read(msfile, format='MSEED', details=True, headonly=True)
+
+        # the same for every trace in the file
+        dfile = os.path.basename(msfile)
+        if absolute_paths:
+            idir = os.path.dirname(os.path.realpath(msfile))
+        else:
+            idir = os.path.dirname(msfile)
+            # make sure relative paths are non-empty
+            if idir == '':
+               idir = '.'
+
         # a single miniSEED file may be multiple traces.  we need to identify the
         # file offsets (bytes) to each trace.  Traces are added to the Stream in
         # order, with enough header information to calculate that.
         foff = 0
         for tr in st:
-            rows = mseed.mseedhdr2tables(tr.stats, wfdisc=tables['wfdisc'],
+            stats = tr.stats
+            rows = mseed.mseedhdr2tables(stats, wfdisc=tables['wfdisc'],
                                          site=tables['site'], sitechan=tables['sitechan'],
                                          affiliation=tables['affiliation'])
 
-            foff += tr.stats.mseed.number_of_records * tr.stats.mseed.record_length
-            rows['wfdisc'][0].foff = foff
-            rows['wfdisc'][0].dfile = os.path.basename(msfile)
-            
-            if absolute_paths:
-                idir = os.path.dirname(os.path.realpath(msfile))
-            else:
-                idir = os.path.dirname(msfile)
-                # make sure relative paths are non-empty
-                if idir == '':
-                   idir = '.'
-            rows['wfdisc'][0].dir = idir
+            # each trace starts after the records of the traces before it
+            wf = rows['wfdisc'][0]
+            wf.foff = foff
+            wf.dfile = dfile
+            wf.dir = idir
+            mseedstats = stats.mseed
+            foff += mseedstats.number_of_records * mseedstats.record_length
 
             # manage the ids
             make_atomic(last, **rows)
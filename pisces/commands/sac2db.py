@@ -3,7 +3,6 @@ Functions that support bulk conversion of SAC files to database tables.
 
 """
 import os
-import sys
 import glob
 import argparse
 import imp
@@ -12,7 +11,6 @@ from sqlalchemy import create_engine
 import sqlalchemy.exc as exc
 import sqlalchemy.orm.exc as oexc
 
-from obspy import read
 from obspy.io.sac.core import _is_sac
 
 import pisces as ps
@@ -143,25 +141,18 @@ def main(**kwargs):
 
         # row_dicts = get_row_dicts(item)
 
-        tr = read(sacfile, format='SAC', debug_headers=True)[0]
+        # only the header is needed, not the waveform data
+        with open(sacfile, 'rb') as f:
+            buf = f.read(sac.SAC_HEADER_SIZE)
+        header = sac.parse_sac_binary_header(buf)
 
         # sachdr2tables produces table dictionaries
         # rows needs to be a dict of lists, for make_atomic
-        dicts = sac.sachdr2tables(tr.stats.sac, tables=tables.keys())
+        dicts = sac.sachdr2tables(header, tables=tables.keys())
         rows = dicts2rows(dicts, tables)
 
         # manage dir, dfile, datatype
-        # XXX: hack.  replace with an updated obspy.io.sac later.
-        bo = tr.data.dtype.byteorder
-        if bo == '<':
-            datatype = 'f4'
-        elif bo == '>':
-            datatype = 't4'
-        elif bo == '=':
-            if sys.byteorder == 'little':
-                datatype = 'f4'
-            else:
-                datatype = 't4'
+        datatype = 'f4' if sac.get_sac_byteorder(buf) == '<' else 't4'
 
         for wf in rows['wfdisc']:
             wf.datatype = datatype
@@ -2,6 +2,8 @@
 Support for mapping miniSEED data into database tables.
 
 """
+from pisces.io.util import _epoch_to_jdate
+
 
 def mseedhdr2tables(stats, wfdisc=None, site=None, sitechan=None, affiliation=None):
     """
@@ -47,6 +49,9 @@ def mseedhdr2tables(stats, wfdisc=None, site=None, sitechan=None, affiliation=No
              'chan': chan,
              'time': _time,
              'endtime': _endtime,
+             'jdate': _epoch_to_jdate(_time),
+             'nsamp': nsamp,
+             'samprate': samprate,
              'calib': calib,
              'datatype': 'sd'}
 
@@ -60,7 +65,7 @@ def mseedhdr2tables(stats, wfdisc=None, site=None, sitechan=None, affiliation=No
     
     # 3.
     if wfdisc:
-        wfdiscrow = wfdisc(**wfrow)
+        wfrow = wfdisc(**wfrow)
     
     if site:
         siterow = site(**siterow)
@@ -72,7 +77,7 @@ def mseedhdr2tables(stats, wfdisc=None, site=None, sitechan=None, affiliation=No
         affilrow = affiliation(**affilrow)
 
     # 4.
-    rows = {'wfdisc': [wfdiscrow],
+    rows = {'wfdisc': [wfrow],
             'site': [siterow],
             'sitechan': [sitechanrow],
             'affiliation': [affilrow]}
@@ -104,7 +104,8 @@ def read_seed(DATAFILE, BYTEOFFSET=0, NUM=None):
             # unfortunately, this read command reads every header
             tr = read(f0, format='MSEED', details=True, headonly=True)[0]
             f0.seek(BYTEOFFSET)
-            nbytes = tr.stats.mseed.number_of_records * tr.stats.mseed.record_length
+            mseedstats = tr.stats.mseed
+            nbytes = mseedstats.number_of_records * mseedstats.record_length
             f = BytesIO(f0.read(nbytes))
 
         tr = read(f, format='MSEED')[0]
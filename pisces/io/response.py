@@ -1,3 +1,4 @@
+import io
 import numpy as np
 from obspy.core.inventory import response
 import warnings
@@ -7,10 +8,90 @@ from obspy.core.inventory.response import ComplexWithUncertainties
 from math import pi
 from obspy.core import UTCDateTime
 import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import singledispatch
 from obspy.core.inventory.response import ComplexWithUncertainties, PolesZerosResponseStage, \
     CoefficientsTypeResponseStage,PolynomialResponseStage,ResponseListResponseStage, \
     ResponseStage, FIRResponseStage
 
+# map of StationXML unit names to the ground motion or signal type they measure
+UNIT_MAP = {"M": "DISP",
+            "NM": "DISP",
+            "CM": "DISP",
+            "MM": "DISP",
+            "M/S": "VEL",
+            "M/SEC": "VEL",
+            "NM/S": "VEL",
+            "NM/SEC": "VEL",
+            "CM/S": "VEL",
+            "CM/SEC": "VEL",
+            "MM/S": "VEL",
+            "MM/SEC": "VEL",
+            "M/S**2": "ACC",
+            "M/(S**2)": "ACC",
+            "M/SEC**2": "ACC",
+            "M/(SEC**2)": "ACC",
+            "M/S/S": "ACC",
+            "NM/S**2": "ACC",
+            "NM/(S**2)": "ACC",
+            "NM/SEC**2": "ACC",
+            "NM/(SEC**2)": "ACC",
+            "CM/S**2": "ACC",
+            "CM/(S**2)": "ACC",
+            "CM/SEC**2": "ACC",
+            "CM/(SEC**2)": "ACC",
+            "MM/S**2": "ACC",
+            "MM/(S**2)": "ACC",
+            "MM/SEC**2": "ACC",
+            "MM/(SEC**2)": "ACC",
+            "V": "VOLTS",
+            "VOLT": "VOLTS",
+            "VOLTS": "VOLTS",
+            "COUNT": "COUNTS",
+            "COUNTS": "COUNTS",
+            "PA": "PRESSURE",
+            "PASCAL": "PRESSURE",
+            "PASCALS": "PRESSURE",
+            "MBAR": "PRESSURE",
+            "T": "TESLA"}
+
+# (stage input unit type, stage output unit type) to the assumed stage source type and
+# the header lines explaining it, formatted with the stage number, input and output types
+_SOURCE_TYPES = {('VOLTS', 'VOLTS'): ('digitizer', '# Assuming stage {} source description is "preamplifier" as stage \n# input units and stage output units are in VOLTS.\n#\n'),
+                 ('VOLTS', 'COUNTS'): ('digitizer', '# Assuming stage {} source description is "digitizer" as stage \n# input units are in VOLTS and stage output units are in COUNTS.\n#\n'),
+                 ('COUNTS', 'COUNTS'): ('anti-alias', '# Assuming stage {} source description is "anti-alias" as stage \n# input units and stage output units are in COUNTS.\n#\n')}
+for _inType in ('DISP', 'VEL', 'ACC', 'PRESSURE', 'TESLA'):
+    _SOURCE_TYPES[(_inType, 'VOLTS')] = ('instrument', '# Assuming stage {} source description is "instrument" as stage \n# input units are in {} and stage output units are in {}.\n#\n')
+    _SOURCE_TYPES[(_inType, 'COUNTS')] = ('instrument', '# Setting stage {} source description to "instrument" though stage \n# input units are in {} and stage output units are in {}.\n#\n')
+del _inType
+_UNKNOWN_SOURCE_TYPE = ('unknown', '# Setting stage {} source description to "unknown" as stage \n# input and output units of {} and {} are unexpected combination.\n#\n')
+
+# sensor and instrument table columns written by sxml2pazfir
+# tshift is clock errors, digital is d/a
+SENSOR_COLUMNS = ('sta', 'chan', 'time', 'endtime', 'inid', 'chanid', 'jdate', 'calratio', 'calper',
+                  'tshift', 'instant')
+INSTRUMENT_COLUMNS = ('inid', 'insname', 'instype', 'band', 'digital', 'samprate', 'ncalib', 'ncalper',
+                      'dir', 'dfile', 'rsptype')
+
+# pazfir file extension for every combination of stage types, in paz, fir, iir, fap order
+_EXT_BITS = {'paz': 1, 'fir': 2, 'iir': 4, 'fap': 8}
+_EXT_TABLE = tuple(''.join(ext for ext, bit in _EXT_BITS.items() if mask & bit) for mask in range(16))
+
+# network and location placeholders replaced in pazfir file names
+_NET_CANON = {'UKNOWN': '__'}
+_LOC_CANON = {'N/A': ''}
+
+# buffer size in bytes for pazfir and table files, large fap stages produce many lines
+_WRITE_BUFFER_SIZE = 1 << 20
+
+# pazfir body line templates for the stage description line and a FAP table row
+_STAGE_LINE_FMT = '{:<12} {:<2} {:<12} {:<6} {}\n'
+_FAP_FMT = '%-12.8f%-12.8f% -13.8f%-12.8f%-12.8f'
+
+# formatted error column for the common case of a value with no uncertainty
+_ZERO_ERR = f'{0.0:< 15.6e}'
+
 def get_pazfir_lines(path):
     """
     Takes a file path and read in the file into a list where each element is a line
@@ -740,6 +821,25 @@ def get_errors_from_obspy_uncertainties(varType):
     
     return vErr
 
+def _get_errors_from_obspy_uncertainties_array(varTypes):
+    """
+    Array version of get_errors_from_obspy_uncertainties for a sequence of 
+    ObsPy values with uncertainties, e.g. all amplitudes of a FAP stage.
+    Returns a float array of the largest uncertainty of each value, or 0 where 
+    both uncertainties are None.
+    """
+    num = len(varTypes)
+    lower = np.fromiter((np.nan if v.lower_uncertainty is None else v.lower_uncertainty for v in varTypes),
+                        dtype=np.float64, count=num)
+    upper = np.fromiter((np.nan if v.upper_uncertainty is None else v.upper_uncertainty for v in varTypes),
+                        dtype=np.float64, count=num)
+
+    # fmax ignores a missing (nan) uncertainty if the other one is present
+    vErrs = np.fmax(lower, upper)
+    vErrs[np.isnan(vErrs)] = 0.0
+
+    return vErrs
+
 def get_source_type_from_units(inType, outType, stageNum):
 
     """
@@ -766,28 +866,12 @@ def get_source_type_from_units(inType, outType, stageNum):
         Line to be added to the file header
     """
 
-    if inType in ['DISP','VEL','ACC','PRESSURE','TESLA'] and outType in ['VOLTS','COUNTS']:
-        sourceType = 'instrument'
-        if outType == 'COUNTS':
-            linesOut = '# Setting stage {} source description to "instrument" though stage \n# input units are in {} and stage output units are in {}.\n#\n'.format(stageNum, inType, outType)
-        else:
-            linesOut = '# Assuming stage {} source description is "instrument" as stage \n# input units are in {} and stage output units are in {}.\n#\n'.format(stageNum, inType, outType)
-    elif inType == 'VOLTS' and outType == 'VOLTS':
-        sourceType = 'digitizer'
-        linesOut = '# Assuming stage {} source description is "preamplifier" as stage \n# input units and stage output units are in VOLTS.\n#\n'.format(stageNum)
-    elif inType == 'VOLTS' and outType == 'COUNTS':
-        sourceType = 'digitizer'
-        linesOut = '# Assuming stage {} source description is "digitizer" as stage \n# input units are in VOLTS and stage output units are in COUNTS.\n#\n'.format(stageNum)
-    elif inType == 'COUNTS' and outType == 'COUNTS':
-        sourceType = 'anti-alias'
-        linesOut = '# Assuming stage {} source description is "anti-alias" as stage \n# input units and stage output units are in COUNTS.\n#\n'.format(stageNum)
-    else:
-        sourceType = 'unknown'
-        linesOut = '# Setting stage {} source description to "unknown" as stage \n# input and output units of {} and {} are unexpected combination.\n#\n'.format(stageNum, inType, outType)
+    sourceType, linesFormat = _SOURCE_TYPES.get((inType, outType), _UNKNOWN_SOURCE_TYPE)
+    linesOut = linesFormat.format(stageNum, inType, outType)
 
     return sourceType, linesOut
 
-def get_stationxml_lines(respStage):
+def get_stationxml_lines(respStage, zeros=None):
 
     """
     Extract variables from a response stage to write the contents of that stage to the 
@@ -799,6 +883,9 @@ def get_stationxml_lines(respStage):
         Input is ObsPy response object of a finite set of types PolesZerosResponseStage,
         CoefficientsTypeResponseStage, FIRResponseStage, and ResponseListResponseStage as 
         well as the ResponseStage parent object.
+    zeros: list, optional
+        Zeros of a PolesZerosResponseStage to count instead of respStage.zeros, such as
+        the zeros written to the file after unit conversion.
 
     Returns
     -------
@@ -806,41 +893,112 @@ def get_stationxml_lines(respStage):
         Lines to be added to the header describing the input stage object
     """
 
-    respStageLines = '# Stage {}: Original StationXML Stage\n'.format(respStage.stage_sequence_number)
-    respStageLines = respStageLines + '#\tInput Units: {} ({})\n'.format(respStage.input_units.upper(),respStage.input_units_description)
-    respStageLines = respStageLines + '#\tOutput Units: {} ({})\n'.format(respStage.output_units.upper(),respStage.output_units_description)
-    respStageLines = respStageLines + '#\tStage Gain: {} at {} Hz\n'.format(respStage.stage_gain,respStage.stage_gain_frequency)
-    respStageLines = respStageLines + '#\tStage Type: {} \n'.format(respStage.__class__.__name__)
+    respStageLines = ['# Stage {}: Original StationXML Stage\n'.format(respStage.stage_sequence_number)]
+    respStageLines.append('#\tInput Units: {} ({})\n'.format(respStage.input_units.upper(),respStage.input_units_description))
+    respStageLines.append('#\tOutput Units: {} ({})\n'.format(respStage.output_units.upper(),respStage.output_units_description))
+    respStageLines.append('#\tStage Gain: {} at {} Hz\n'.format(respStage.stage_gain,respStage.stage_gain_frequency))
+    respStageLines.append('#\tStage Type: {} \n'.format(respStage.__class__.__name__))
     
     if respStage.__class__.__name__ == 'PolesZerosResponseStage':
-        respStageLines = respStageLines + '#\tTransfer Function: {} \n'.format(respStage.pz_transfer_function_type)
-        respStageLines = respStageLines + '#\tNormalization Factor: {} at {} Hz \n'.format(respStage.normalization_factor, respStage.normalization_frequency)
-        respStageLines = respStageLines + '#\tNumber of Poles: {}\n'.format(len(respStage.poles))
-        respStageLines = respStageLines + '#\tNumber of Zeros: {}\n'.format(len(respStage.zeros))
+        respStageLines.append('#\tTransfer Function: {} \n'.format(respStage.pz_transfer_function_type))
+        respStageLines.append('#\tNormalization Factor: {} at {} Hz \n'.format(respStage.normalization_factor, respStage.normalization_frequency))
+        respStageLines.append('#\tNumber of Poles: {}\n'.format(len(respStage.poles)))
+        respStageLines.append('#\tNumber of Zeros: {}\n'.format(len(respStage.zeros if zeros is None else zeros)))
 
     elif respStage.__class__.__name__ == 'CoefficientsTypeResponseStage':
-        respStageLines = respStageLines + '#\tTransfer Function: {} \n'.format(respStage.cf_transfer_function_type)
-        respStageLines = respStageLines + '#\tNumber of Numerators: {}\n'.format(len(respStage.numerator))
-        respStageLines = respStageLines + '#\tNumber of Denominators: {}\n'.format(len(respStage.denominator))
+        respStageLines.append('#\tTransfer Function: {} \n'.format(respStage.cf_transfer_function_type))
+        respStageLines.append('#\tNumber of Numerators: {}\n'.format(len(respStage.numerator)))
+        respStageLines.append('#\tNumber of Denominators: {}\n'.format(len(respStage.denominator)))
     
     elif respStage.__class__.__name__ == 'FIRResponseStage':
-        respStageLines = respStageLines + '#\tTransfer Function: DIGITAL \n'
-        respStageLines = respStageLines + '#\tNumber of Numerators: {}\n'.format(len(respStage.coefficients))
+        respStageLines.append('#\tTransfer Function: DIGITAL \n')
+        respStageLines.append('#\tNumber of Numerators: {}\n'.format(len(respStage.coefficients)))
     
     elif respStage.__class__.__name__ == 'ResponseListResponseStage':
-        respStageLines = respStageLines + '#\tNumber of FAP measurements: {}\n'.format(len(respStage.response_list_elements))
+        respStageLines.append('#\tNumber of FAP measurements: {}\n'.format(len(respStage.response_list_elements)))
     
     if respStage.decimation_factor is not None:
-        respStageLines = respStageLines + '#\tDecimation: \n'
-        respStageLines = respStageLines + '#\t\tInput Sample Rate: {}\n'.format(respStage.decimation_input_sample_rate)
-        respStageLines = respStageLines + '#\t\tDecimation Factor: {}\n'.format(respStage.decimation_factor)
-        respStageLines = respStageLines + '#\t\tDecimation Offset: {}\n'.format(respStage.decimation_offset)
-        respStageLines = respStageLines + '#\t\tDecimation Delay: {}\n'.format(respStage.decimation_delay)
-        respStageLines = respStageLines + '#\t\tDecimation Correction: {}\n'.format(respStage.decimation_correction)
+        respStageLines.append('#\tDecimation: \n')
+        respStageLines.append('#\t\tInput Sample Rate: {}\n'.format(respStage.decimation_input_sample_rate))
+        respStageLines.append('#\t\tDecimation Factor: {}\n'.format(respStage.decimation_factor))
+        respStageLines.append('#\t\tDecimation Offset: {}\n'.format(respStage.decimation_offset))
+        respStageLines.append('#\t\tDecimation Delay: {}\n'.format(respStage.decimation_delay))
+        respStageLines.append('#\t\tDecimation Correction: {}\n'.format(respStage.decimation_correction))
+
+    respStageLines.append('#\n')
 
-    respStageLines = respStageLines + '#\n'
+    return ''.join(respStageLines)
+
+def _rows_to_table_dict(tablename, columns, rows):
+    """
+    Turn a list of row tuples into the column dictionary used by 
+    write_dict_to_flatfile, with the table name under the 'tablename' key.
+    """
+    tableDict = {'tablename': tablename}
+    tableDict.update((column, []) for column in columns)
+    for column, values in zip(columns, zip(*rows)):
+        tableDict[column] = list(values)
+
+    return tableDict
+
+def _format_sensor_row(sta, chan, time, endtime, inid, chanid, jdate, calratio, calper, tshift, instant):
+    """
+    Format one fixed-width line of the sensor flatfile.  Arguments are in 
+    SENSOR_COLUMNS order.
+    """
+    if inid == -1:
+        inidStr = '{:>8s}'.format(str(inid))
+    else:
+        inidStr = '{:>8d}'.format(inid)
+
+    if chanid == -1:
+        chanidStr = '{:>8s}'.format(str(chanid))
+    else:
+        chanidStr = '{:>8d}'.format(chanid)
+
+    if jdate == -1:
+        jDateStr = '{:>8s}'.format(str(jdate))
+    else:
+        jDateStr = '{:>8d}'.format(jdate)
+
+    if calratio == 1:
+        calratioStr = '{:>16s}'.format(str(calratio))
+    else:
+        calratioStr = '{:>16.6f}'.format(calratio)
+
+    if calper == -1:
+        calperStr = '{:>16s}'.format(str(calper))
+    else:
+        calperStr = '{:>16.6f}'.format(calper)
+    
+    rowLine = '{:<6s} {:<8s} {:>17.5f} {:>17.5f} {} {} {} {} {} {:>16.2f} {:<1s}\n'.format(\
+        sta, chan, time, endtime, inidStr, chanidStr, jDateStr, calratioStr, calperStr, tshift, instant)
+
+    return rowLine
+
+def _format_instrument_row(inid, insname, instype, band, digital, samprate, ncalib, ncalper, insDir, dfile, rsptype):
+    """
+    Format one fixed-width line of the instrument flatfile.  Arguments are in 
+    INSTRUMENT_COLUMNS order.
+    """
+    if ncalper == 1:
+        ncalperStr = '{:>16s}'.format(str(ncalper))
+    else:
+        ncalperStr = '{:>16.6f}'.format(ncalper)
+
+    if ncalib == -1:
+        ncalibStr = '{:>16s}'.format(str(ncalib))
+    else:
+        ncalibStr = '{:>16.6f}'.format(ncalib)
 
-    return respStageLines
+    rowLine = '{:<8d} {:<50s} {:<6s} {:<1s} {:<1s} {:>11.7f} {} {} {:<64s} {:<32s} {:<6s}\n'.format( \
+        inid, insname, instype, band, digital, samprate, ncalibStr, ncalperStr, insDir, dfile, rsptype)
+
+    return rowLine
+
+# table name to its flatfile name, row formatter, and columns
+_TABLE_FORMATS = {'sensor': ('sensor_table.txt', _format_sensor_row, SENSOR_COLUMNS),
+                  'instrument': ('instrument_table.txt', _format_instrument_row, INSTRUMENT_COLUMNS)}
 
 def write_dict_to_flatfile(tableDict, dirPath = None):
 
@@ -864,74 +1022,291 @@ def write_dict_to_flatfile(tableDict, dirPath = None):
     Writes file to directory labeled either instrument.txt or sensor.txt
     """
 
-    tableLines = ''
-    if tableDict['tablename'] == 'sensor':
-        for dex in range(len(tableDict['chanid'])):
-            if tableDict['inid'][dex] == -1:
-                inidStr = '{:>8s}'.format(str(tableDict['inid'][dex]))
-            else:
-                inidStr = '{:>8d}'.format(tableDict['inid'][dex])
+    fileName, formatRow, columns = _TABLE_FORMATS[tableDict['tablename']]
 
-            if tableDict['chanid'][dex] == -1:
-                chanidStr = '{:>8s}'.format(str(tableDict['chanid'][dex]))
-            else:
-                chanidStr = '{:>8d}'.format(tableDict['chanid'][dex])
+    # a bare file name is written to the current working directory
+    outpath = os.path.join(dirPath or '', fileName)
 
-            if tableDict['jdate'][dex] == -1:
-                jDateStr = '{:>8s}'.format(str(tableDict['jdate'][dex]))
-            else:
-                jDateStr = '{:>8d}'.format(tableDict['jdate'][dex])
+    with open(outpath, 'w', buffering=_WRITE_BUFFER_SIZE) as tableFile:
+        for row in zip(*[tableDict[column] for column in columns]):
+            tableFile.write(formatRow(*row))
 
-            if tableDict['calratio'][dex] == 1:
-                calratioStr = '{:>16s}'.format(str(tableDict['calratio'][dex]))
-            else:
-                calratioStr = '{:>16.6f}'.format(tableDict['calratio'][dex])
+    return
+    
 
-            if tableDict['calper'][dex] == -1:
-                calperStr = '{:>16s}'.format(str(tableDict['calper'][dex]))
-            else:
-                calperStr = '{:>16.6f}'.format(tableDict['calper'][dex])
-            
-            rowLine = '{:<6s} {:<8s} {:>17.5f} {:>17.5f} {} {} {} {} {} {:>16.2f} {:<1s}\n'.format(\
-                tableDict['sta'][dex], tableDict['chan'][dex],tableDict['time'][dex], tableDict['endtime'][dex], inidStr, \
-                chanidStr, jDateStr, calratioStr, calperStr, tableDict['tshift'][dex], tableDict['instant'][dex])
-            
-            tableLines = tableLines + rowLine
-        fileName = 'sensor_table.txt'
+def _write_paz_stage(respStage, headerBuf, bodyBuf, out_freq):
+    """
+    Write a PolesZerosResponseStage to the pazfir header and body buffers.
+    Returns the stage type written, 'paz'.
+    """
 
-    elif tableDict['tablename'] == 'instrument':
-        for dex in range(len(tableDict['inid'])):
-            if tableDict['ncalper'][dex] == 1:
-                ncalperStr = '{:>16s}'.format(str(tableDict['ncalper'][dex]))
-            else:
-                ncalperStr = '{:>16.6f}'.format(tableDict['ncalper'][dex])
+    if respStage.pz_transfer_function_type == 'DIGITAL (Z-TRANSFORM)':
+        raise NotImplementedError('Conversion of PolesZerosResponseStage transfer function of type "DIGITAL (Z-TRANSFORM)" to type "LAPLACE (RADIANS/SECOND)" not implemented')
 
-            if tableDict['ncalib'][dex] == -1:
-                ncalibStr = '{:>16s}'.format(str(tableDict['ncalib'][dex]))
-            else:
-                ncalibStr = '{:>16.6f}'.format(tableDict['ncalib'][dex])
-            rowLine = '{:<8d} {:<50s} {:<6s} {:<1s} {:<1s} {:>11.7f} {} {} {:<64s} {:<32s} {:<6s}\n'.format( \
-                tableDict['inid'][dex], tableDict['insname'][dex],tableDict['instype'][dex], tableDict['band'][dex], \
-                tableDict['digital'][dex],tableDict['samprate'][dex], ncalibStr, ncalperStr, tableDict['dir'][dex], \
-                tableDict['dfile'][dex], tableDict['rsptype'][dex])
-            
-            tableLines = tableLines + rowLine
-        fileName = 'instrument_table.txt'
+    # Make unit based adjustments here
+    stageInUnitType = UNIT_MAP[respStage.input_units.upper()]
+    stageOutUnitType = UNIT_MAP[respStage.output_units.upper()]
+
+    # zeros are added to a copy, so the caller's response is unchanged
+    zeros = list(respStage.zeros)
+    if stageInUnitType == 'VEL':
+        zeros.append(ComplexWithUncertainties(0j))
+    elif stageInUnitType == 'ACC':
+        zeros.append(ComplexWithUncertainties(0j))
+        zeros.append(ComplexWithUncertainties(0j))
+    A0 = a0_from_pz(respStage.poles, zeros, out_freq)
+
+    # Convert from Laplace(HERTZ) to Laplace (RAD/S)
+    funcConv = 1.0
+
+    if respStage.pz_transfer_function_type == 'LAPLACE (HERTZ)':
+        funcConv = 2 * pi
+        A0 *= funcConv ** (len(respStage.poles) - len(zeros))
+    
+    # Set stage info for file
+    t_v_m = 'theoretical'  # set paz, fir, iir stages to theoretical, fap stages to measured
+    stageType = 'paz'
+    stageNum = respStage.stage_sequence_number
+    
+    sourceType, linesOut = get_source_type_from_units(stageInUnitType, stageOutUnitType, stageNum)
+    headerBuf.write(linesOut)
+
+    dataSource = 'obspy response'
+
+    bodyBuf.write(_STAGE_LINE_FMT.format(t_v_m, stageNum, sourceType, stageType, dataSource))
+
+    bodyBuf.write(f'{A0: 10.6e}\n')
+    
+    numPoles = len(respStage.poles)
+    numZeros = len(zeros)
+    
+    bodyBuf.write(str(numPoles) +'\n')
+
+    # pazfir only allows for symmetrical error, get largest error between upper and lower and assign to field in pazfir, probably don't need to do the == case
+
+    for p in respStage.poles:
+
+        pReal = p.real * funcConv
+        pImag = p.imag * funcConv
+
+        pRealErr = get_errors_from_obspy_uncertainties(p.real) * funcConv
+        pImagErr = get_errors_from_obspy_uncertainties(p.imag) * funcConv
+        
+        if pRealErr == 0.0 and pImagErr == 0.0:
+            errPart = _ZERO_ERR + _ZERO_ERR
+        else:
+            errPart = f'{pRealErr:< 15.6e}{pImagErr:< 15.6e}'
+
+        bodyBuf.write(f'{pReal:< 15.6e}{pImag:< 15.6e}' + errPart + '\n')
+
+    bodyBuf.write(str(numZeros) +'\n')
+
+    for z in zeros:
+        zReal = z.real * funcConv
+        zImag = z.imag * funcConv 
+
+        zRealErr = get_errors_from_obspy_uncertainties(z.real) * funcConv
+        zImagErr = get_errors_from_obspy_uncertainties(z.imag) * funcConv
+        
+        if zRealErr == 0.0 and zImagErr == 0.0:
+            errPart = _ZERO_ERR + _ZERO_ERR
+        else:
+            errPart = f'{zRealErr:< 15.6e}{zImagErr:< 15.6e}'
+
+        bodyBuf.write(f'{zReal:< 15.6e}{zImag:< 15.6e}' + errPart + '\n')
+
+    respStageLines = get_stationxml_lines(respStage, zeros=zeros)
+    headerBuf.write(respStageLines)
+
+    return stageType
+
+
+def _write_coefficients_stage(respStage, headerBuf, bodyBuf, out_freq):
+    """
+    Write a CoefficientsTypeResponseStage to the pazfir header and body buffers.
+    Returns the stage type written, 'fir' or 'iir', or None if the stage has no
+    coefficients.
+    """
+
+    if respStage.cf_transfer_function_type in ['ANALOG (RADIANS/SECOND)','ANALOG (HERTZ)']:
+        raise NotImplementedError('Conversion of CoefficientsTypeResponseStage transfer function of type "{}" to type "DIGITAL" not implemented'.format(respStage.cf_transfer_function_type))
+
+    stageInUnitType = UNIT_MAP[respStage.input_units.upper()]
+    stageOutUnitType = UNIT_MAP[respStage.output_units.upper()]
+    stageNum = respStage.stage_sequence_number 
     
-    if dirPath is None:
-        dirPath = os.getcwd()
+    sourceType, linesOut = get_source_type_from_units(stageInUnitType, stageOutUnitType, stageNum)
+    headerBuf.write(linesOut)
+
+    numNum = len(respStage.numerator)
+    numDenom = len(respStage.denominator)
 
-    if dirPath[-1] == '/':
-        outpath = '{}{}'.format(dirPath,fileName)
+    if numNum > 0 and numDenom == 0:
+        stageExt = 'fir'
+    elif numNum > 0 and numDenom > 0:
+        stageExt = 'iir'
     else:
-        outpath = '{}/{}'.format(dirPath,fileName)
+        headerBuf.write('# No coefficients found.  Skipping stage in file, \n# but gain values are accounted for in sensitivity value.\n#\n')
+        respStageLines = get_stationxml_lines(respStage)
+        headerBuf.write(respStageLines)
+        return None
 
-    tableFile = open(outpath,'w')
-    tableFile.write(tableLines)
-    tableFile.close()
+    t_v_m = 'theoretical'  # set paz, fir, iir stages to theoretical, fap stages to measured
+    stageType = stageExt
+    dataSource = 'obspy response'
 
-    return
+    decimSampRate = respStage.decimation_input_sample_rate
+
+    bodyBuf.write(_STAGE_LINE_FMT.format(t_v_m, stageNum, sourceType, stageType, dataSource))
+    bodyBuf.write(f'{decimSampRate: 10.6e}\n')
+    bodyBuf.write(str(numNum) +'\n')
+
+    for n in respStage.numerator:
+        nErr = get_errors_from_obspy_uncertainties(n)
+        if nErr == 0.0:
+            bodyBuf.write(f'{n:< 15.6e}' + _ZERO_ERR + '\n')
+        else:
+            bodyBuf.write(f'{n:< 15.6e}{nErr:< 15.6e}\n')
+    
+    bodyBuf.write(str(numDenom) +'\n')
+
+    if numDenom > 0:
+        for d in respStage.denominator:
+            dErr = get_errors_from_obspy_uncertainties(d)
+            if dErr == 0.0:
+                bodyBuf.write(f'{d:< 15.6e}' + _ZERO_ERR + '\n')
+            else:
+                bodyBuf.write(f'{d:< 15.6e}{dErr:< 15.6e}\n')
+
+    respStageLines = get_stationxml_lines(respStage)
+    headerBuf.write(respStageLines)
+
+    return stageType
+
+
+def _write_fir_stage(respStage, headerBuf, bodyBuf, out_freq):
+    """
+    Write a FIRResponseStage to the pazfir header and body buffers.
+    Returns the stage type written, 'fir', or None if the stage has no 
+    coefficients.
+    """
+
+    numNum = len(respStage.coefficients)
+    
+    if numNum == 0:
+        headerBuf.write('# No coefficients found.  Skipping stage in file, \n# but gain values are accounted for in sensitivity value.\n#\n')
+        respStageLines = get_stationxml_lines(respStage)
+        headerBuf.write(respStageLines)
+        return None
+
+    stageInUnitType = UNIT_MAP[respStage.input_units.upper()]
+    stageOutUnitType = UNIT_MAP[respStage.output_units.upper()]
+    stageNum = respStage.stage_sequence_number
     
+    sourceType, linesOut = get_source_type_from_units(stageInUnitType, stageOutUnitType, stageNum)
+    headerBuf.write(linesOut)
+
+    t_v_m = 'theoretical'  # set paz, fir, iir stages to theoretical, fap stages to measured
+    stageType = 'fir'
+    
+    dataSource = 'obspy response' 
+    
+    decimSampRate = respStage.decimation_input_sample_rate
+
+    bodyBuf.write(_STAGE_LINE_FMT.format(t_v_m, stageNum, sourceType, stageType, dataSource))
+    bodyBuf.write(f'{decimSampRate: 10.6e}\n')
+    bodyBuf.write(str(numNum) +'\n')
+
+    for n in respStage.coefficients:
+        nErr = get_errors_from_obspy_uncertainties(n)
+        if nErr == 0.0:
+            bodyBuf.write(f'{n:< 15.6e}' + _ZERO_ERR + '\n')
+        else:
+            bodyBuf.write(f'{n:< 15.6e}{nErr:< 15.6e}\n')
+    
+    bodyBuf.write('0' +'\n')
+
+    respStageLines = get_stationxml_lines(respStage)
+    headerBuf.write(respStageLines)
+
+    return stageType
+
+
+def _write_fap_stage(respStage, headerBuf, bodyBuf, out_freq):
+    """
+    Write a ResponseListResponseStage to the pazfir header and body buffers.
+    Returns the stage type written, 'fap'.
+    """
+
+    stageInUnitType = UNIT_MAP[respStage.input_units.upper()]
+    stageOutUnitType = UNIT_MAP[respStage.output_units.upper()]
+
+    t_v_m = 'theoretical'  # set paz, fir, iir stages to theoretical, fap stages to measured
+    stageType = 'fap'
+    stageNum = respStage.stage_sequence_number
+
+    sourceType, linesOut = get_source_type_from_units(stageInUnitType, stageOutUnitType, stageNum)
+    headerBuf.write(linesOut)
+
+    dataSource = 'obspy response'
+
+    bodyBuf.write(_STAGE_LINE_FMT.format(t_v_m, stageNum, sourceType, stageType, dataSource))
+
+    elements = respStage.response_list_elements
+    fapNum = len(elements)
+    bodyBuf.write(str(fapNum) +'\n')
+
+    # format the whole frequency, amplitude, phase table at once
+    freqs = np.fromiter((e.frequency for e in elements), dtype=np.float64, count=fapNum)
+    amps = np.fromiter((e.amplitude for e in elements), dtype=np.float64, count=fapNum)
+    phas = np.fromiter((e.phase for e in elements), dtype=np.float64, count=fapNum)
+    aErrs = _get_errors_from_obspy_uncertainties_array([e.amplitude for e in elements])
+    pErrs = _get_errors_from_obspy_uncertainties_array([e.phase for e in elements])
+
+    np.savetxt(bodyBuf, np.column_stack([freqs, amps, phas, aErrs, pErrs]), fmt=_FAP_FMT)
+
+    respStageLines = get_stationxml_lines(respStage)
+    headerBuf.write(respStageLines)
+
+    return stageType
+
+
+def _write_polynomial_stage(respStage, headerBuf, bodyBuf, out_freq):
+    raise TypeError('Pazfir file spec does not support Polynomial Responses')
+
+
+def _write_generic_stage(respStage, headerBuf, bodyBuf, out_freq):
+    """
+    Document a generic ResponseStage in the pazfir header.  It contributes no 
+    lines to the body, so None is returned.
+    """
+    headerBuf.write('Generic Obspy ResponseStage object in StationXML File. \n# Does not contribute to pazfir type response. \n')
+    respStageLines = get_stationxml_lines(respStage)
+    headerBuf.write(respStageLines)
+
+    return None
+
+
+@singledispatch
+def _write_stage(respStage, headerBuf, bodyBuf, out_freq):
+    """
+    Write a response stage into a pazfir file, dispatching on the stage type.
+    Subclasses of a known stage type use the writer of their nearest known
+    parent class.
+    """
+    raise TypeError('Unsupported Stage Type: {}'.format(type(respStage).__name__))
+
+
+# ObsPy response stage class to the function writing it into a pazfir file
+for _stageClass, _stageWriter in ((PolesZerosResponseStage, _write_paz_stage),
+                                  (CoefficientsTypeResponseStage, _write_coefficients_stage),
+                                  (FIRResponseStage, _write_fir_stage),
+                                  (ResponseListResponseStage, _write_fap_stage),
+                                  (PolynomialResponseStage, _write_polynomial_stage),
+                                  (ResponseStage, _write_generic_stage)):
+    _write_stage.register(_stageClass, _stageWriter)
+del _stageClass, _stageWriter
+
 
 def write_pazfir(response, station, channel, starttime, out_freq = None, dir_path = None, network = None, location = None, \
                  endtime = None, sample_rate = None,sensor = None, data_logger = None, pre_amplifier = None, **stationDict):
@@ -1003,11 +1378,12 @@ def write_pazfir(response, station, channel, starttime, out_freq = None, dir_pat
     """
     
     # get set of lines to be written in header separate from values lines and combine at the end
-    headerLines = "# Response file created using pisces write_pazfir funcion \n# on {}\n#\n".format(datetime.now().strftime('%Y/%m/%d %H:%M'))
+    headerBuf = io.StringIO()
+    headerBuf.write("# Response file created using pisces write_pazfir funcion \n# on {}\n#\n".format(datetime.now().strftime('%Y/%m/%d %H:%M')))
 
     # Add station info to header and assign variables
 
-    headerLines = headerLines + '# Station Information:\n'
+    headerBuf.write('# Station Information:\n')
 
     if network is not None:
         pass
@@ -1017,9 +1393,9 @@ def write_pazfir(response, station, channel, starttime, out_freq = None, dir_pat
             network = 'UNKNOWN'
     else:
         network = 'UNKNOWN'
-    headerLines = headerLines + '#\t Network: {}\n'.format(network)
+    headerBuf.write('#\t Network: {}\n'.format(network))
 
-    headerLines = headerLines + '#\t Station: {}\n'.format(station)
+    headerBuf.write('#\t Station: {}\n'.format(station))
     
     if location is not None:
         pass
@@ -1029,11 +1405,11 @@ def write_pazfir(response, station, channel, starttime, out_freq = None, dir_pat
             location = 'N/A'
     else:
         location = 'N/A'
-    headerLines = headerLines + '#\t Location: {}\n'.format(location)
+    headerBuf.write('#\t Location: {}\n'.format(location))
     
-    headerLines = headerLines + '#\t Channel: {}\n'.format(channel)
+    headerBuf.write('#\t Channel: {}\n'.format(channel))
     
-    headerLines = headerLines + '#\t Start Date: {}\n'.format(starttime)
+    headerBuf.write('#\t Start Date: {}\n'.format(starttime))
 
     if endtime is not None:
         pass
@@ -1043,7 +1419,7 @@ def write_pazfir(response, station, channel, starttime, out_freq = None, dir_pat
             endtime = 'UNKNOWN'
         elif endtime.timestamp == 9999999999.999:
             endtime = 'PRESENT'
-    headerLines = headerLines + '#\t End Date: {}\n'.format(endtime)
+    headerBuf.write('#\t End Date: {}\n'.format(endtime))
 
     if sample_rate is not None:
         pass
@@ -1052,7 +1428,7 @@ def write_pazfir(response, station, channel, starttime, out_freq = None, dir_pat
         if sample_rate is None:
             sample_rate = 'UNKNOWN'
     elsesample_rate = 'UNKNOWN'
-    headerLines = headerLines + '#\t Sampling Rate: {}\n'.format(sample_rate)
+    headerBuf.write('#\t Sampling Rate: {}\n'.format(sample_rate))
     
     if sensor is not None:
         pass
@@ -1062,400 +1438,247 @@ def write_pazfir(response, station, channel, starttime, out_freq = None, dir_pat
             sensor = 'UNKNOWN'
     else:
         sensor = 'UNKNOWN'
-    headerLines = headerLines + '#\t Sensor: {}\n'.format(sensor)
+    headerBuf.write('#\t Sensor: {}\n'.format(sensor))
 
     if pre_amplifier is not None:
         pass
     if 'pre_amplifier' in stationDict:
         pre_amplifier = stationDict['pre_amplifier']
         if pre_amplifier is not None:
-            headerLines = headerLines + '#\t Pre-amplifier: {}\n'.format(pre_amplifier)
+            headerBuf.write('#\t Pre-amplifier: {}\n'.format(pre_amplifier))
 
     if data_logger is not None:
         pass
     elif 'data_logger' in stationDict:
         data_logger = stationDict['data_logger']
         if data_logger is not None:
-            headerLines = headerLines + '#\t Data Logger: {}\n'.format(data_logger)
+            headerBuf.write('#\t Data Logger: {}\n'.format(data_logger))
     
-    headerLines = headerLines + '#\n'
+    headerBuf.write('#\n')
+
+    responseStages = response.response_stages
+    firstStage = responseStages[0]
+    instSens = response.instrument_sensitivity
 
     # get frequency from first stage if out_freq is None type 
     if out_freq is None:
-        if isinstance(response.response_stages[0],PolesZerosResponseStage):
-            out_freq = response.response_stages[0].normalization_frequency
+        if isinstance(firstStage,PolesZerosResponseStage):
+            out_freq = firstStage.normalization_frequency
         else:
-            out_freq = response.response_stages[0].stage_gain_frequency
+            out_freq = firstStage.stage_gain_frequency
         
-        headerLines = headerLines + '# No frequency at which to output response information provided.\n'
-        headerLines = headerLines + '# Using frequency {} Hz in Stage 1: {}\n#\n'.format(out_freq, response.response_stages[0].__class__.__name__)
+        headerBuf.write('# No frequency at which to output response information provided.\n')
+        headerBuf.write('# Using frequency {} Hz in Stage 1: {}\n#\n'.format(out_freq, firstStage.__class__.__name__))
 
 
-    # create a list of lines to be written after header
-    linesWrite = ''
+    # create a buffer of lines to be written after header
+    bodyBuf = io.StringIO()
 
     # Bookkeeping for final steps
-    extensions = []  # may throw out, what extensions are used to write file?
-    delays = []      # XX test this: make sure delays can be summed into one final value and implemented as a final group delay stage
+    extMask = 0      # bitmask of _EXT_BITS for the stage types written to the file
+    # XX: decimation delays could be summed into one final value and implemented as a final group delay stage
 
     # Unit handling
-    inUnitKey = response.instrument_sensitivity.input_units.upper()
-    outUnitKey = response.instrument_sensitivity.output_units.upper()
-
-    unitMap = {"M": "DISP",
-                    "NM": "DISP",
-                    "CM": "DISP",
-                    "MM": "DISP",
-                    "M/S": "VEL",
-                    "M/SEC": "VEL",
-                    "NM/S": "VEL",
-                    "NM/SEC": "VEL",
-                    "CM/S": "VEL",
-                    "CM/SEC": "VEL",
-                    "MM/S": "VEL",
-                    "MM/SEC": "VEL",
-                    "M/S**2": "ACC",
-                    "M/(S**2)": "ACC",
-                    "M/SEC**2": "ACC",
-                    "M/(SEC**2)": "ACC",
-                    "M/S/S": "ACC",
-                    "NM/S**2": "ACC",
-                    "NM/(S**2)": "ACC",
-                    "NM/SEC**2": "ACC",
-                    "NM/(SEC**2)": "ACC",
-                    "CM/S**2": "ACC",
-                    "CM/(S**2)": "ACC",
-                    "CM/SEC**2": "ACC",
-                    "CM/(SEC**2)": "ACC",
-                    "MM/S**2": "ACC",
-                    "MM/(S**2)": "ACC",
-                    "MM/SEC**2": "ACC",
-                    "MM/(SEC**2)": "ACC",
-                    "V": "VOLTS",
-                    "VOLT": "VOLTS",
-                    "VOLTS": "VOLTS",
-                    "COUNT": "COUNTS",
-                    "COUNTS": "COUNTS",
-                    "PA": "PRESSURE",
-                    "PASCAL": "PRESSURE",
-                    "PASCALS": "PRESSURE",
-                    "MBAR": "PRESSURE",
-                    "T": "TESLA"}
-    
-    if inUnitKey not in unitMap:
+    inUnitKey = instSens.input_units.upper()
+    outUnitKey = instSens.output_units.upper()
+
+    if inUnitKey not in UNIT_MAP:
         raise ValueError('Unknown input units of {}'.format(inUnitKey))
-    if outUnitKey not in unitMap:
+    if outUnitKey not in UNIT_MAP:
         raise ValueError('Unknown output units of {}'.format(outUnitKey))
 
-    # outUnitType = unitMap[outUnitKey]
+    # outUnitType = UNIT_MAP[outUnitKey]
     # if outUnitType != 'COUNTS':
     #     raise ValueError('Final response output units must be COUNTS not {}'.format(outUnitType))
     
-    inUnitType = unitMap[inUnitKey]
+    inUnitType = UNIT_MAP[inUnitKey]
+
+    # the reported instrument sensitivity is already valid if it is given at out_freq
+    # in the target units, so evalresp only needs to be called otherwise
+    sensitivityCached = out_freq == instSens.frequency
+
     if inUnitType in ['DISP','VEL','ACC']:
-        sensitivity = abs(response.get_evalresp_response_for_frequencies([out_freq], output='DISP')*1.0E-9)[0]
+        if sensitivityCached and inUnitKey == 'NM':
+            sensitivity = abs(instSens.value)
+        else:
+            sensitivity = abs(response.get_evalresp_response_for_frequencies([out_freq], output='DISP')*1.0E-9)[0]
         outUnitType = 'DISP'
         newOutUnits = 'NM'
         if inUnitKey == 'NM':
-            headerLines = headerLines + '# Original units are DISP in NM.  No conversion required to \n# match KBCore/CSS3.0 database spec.\n#\n'.format(inUnitType, inUnitKey)
+            headerBuf.write('# Original units are DISP in NM.  No conversion required to \n# match KBCore/CSS3.0 database spec.\n#\n'.format(inUnitType, inUnitKey))
         else:
-            headerLines = headerLines + '# Original units are {} in {}.  Converting to DISP in NM to \n# match KBCore/CSS3.0 database spec.\n#\n'.format(inUnitType, inUnitKey)
+            headerBuf.write('# Original units are {} in {}.  Converting to DISP in NM to \n# match KBCore/CSS3.0 database spec.\n#\n'.format(inUnitType, inUnitKey))
 
     elif inUnitType == 'PRESSURE':
         if inUnitKey == 'MBAR':
             sensitivity = abs(response.get_evalresp_response_for_frequencies([out_freq], output='DEF')*100)[0] # convert MBARS to PA
-            headerLines = headerLines + '# Original units are PRESSURE in {}.  Converting to PRESSURE in PA to match KBCore database spec.\n#\n'.format(inUnitKey)
+            headerBuf.write('# Original units are PRESSURE in {}.  Converting to PRESSURE in PA to match KBCore database spec.\n#\n'.format(inUnitKey))
         else:
-            sensitivity = abs(response.get_evalresp_response_for_frequencies([out_freq], output='DEF'))[0]
-            headerLines = headerLines + '# Original units are PRESSURE in PA. No conversion required to match KBCore/CSS3.0 database spec.\n#\n'.format(inUnitKey)
+            if sensitivityCached:
+                sensitivity = abs(instSens.value)
+            else:
+                sensitivity = abs(response.get_evalresp_response_for_frequencies([out_freq], output='DEF'))[0]
+            headerBuf.write('# Original units are PRESSURE in PA. No conversion required to match KBCore/CSS3.0 database spec.\n#\n'.format(inUnitKey))
         outUnitType = 'PRESSURE'
         newOutUnits = 'PA'
 
     else:
         sensitivity = abs(response.get_evalresp_response_for_frequencies([out_freq], output='DEF'))[0]
-        headerLines = headerLines + '# Original units are {} in {}.  No unit conversions performed as these units are not included in KBCore/CSS3.0 database spec.\n'.format(inUnitType, inUnitKey)
-        outUnitType = unitMap[outUnitKey]
+        headerBuf.write('# Original units are {} in {}.  No unit conversions performed as these units are not included in KBCore/CSS3.0 database spec.\n'.format(inUnitType, inUnitKey))
+        outUnitType = UNIT_MAP[outUnitKey]
         newOutUnits = outUnitKey
     
-    headerLines = headerLines + '# Calculated Sensitivity is {:.6f} at {} Hz in {} in {}\n#\n'.format(sensitivity, out_freq, outUnitType, newOutUnits)
-    headerLines = headerLines + '# Stage 0: Original StationXML Instrument Sensitivity Stage \n'
-    headerLines = headerLines + '#\tSensitivity value: {} at {} Hz \n'.format(response.instrument_sensitivity.value, response.instrument_sensitivity.frequency)
-    headerLines = headerLines + '#\tInput Units: {} ({}) \n'.format(response.instrument_sensitivity.input_units, response.instrument_sensitivity.input_units_description)
-    headerLines = headerLines + '#\tOutput Units: {} ({}) \n'.format(response.instrument_sensitivity.output_units, response.instrument_sensitivity.output_units_description)
-    headerLines = headerLines + '#\n'
+    headerBuf.write('# Calculated Sensitivity is {:.6f} at {} Hz in {} in {}\n#\n'.format(sensitivity, out_freq, outUnitType, newOutUnits))
+    headerBuf.write('# Stage 0: Original StationXML Instrument Sensitivity Stage \n')
+    headerBuf.write('#\tSensitivity value: {} at {} Hz \n'.format(instSens.value, instSens.frequency))
+    headerBuf.write('#\tInput Units: {} ({}) \n'.format(instSens.input_units, instSens.input_units_description))
+    headerBuf.write('#\tOutput Units: {} ({}) \n'.format(instSens.output_units, instSens.output_units_description))
+    headerBuf.write('#\n')
 
     # firTrigger = False
 
-    # Write each response stage to linesWrite 
-    for respStage in response.response_stages:
-        stageLines = ''
-
-        if isinstance(respStage,PolesZerosResponseStage):
-            if respStage.pz_transfer_function_type == 'DIGITAL (Z-TRANSFORM)':
-                    raise NotImplementedError('Conversion of PolesZerosResponseStage transfer function of type "DIGITAL (Z-TRANSFORM)" to type "LAPLACE (RADIANS/SECOND)" not implemented')
-
-            # Make unit based adjustments here
-            stageInUnitType = unitMap[respStage.input_units.upper()]
-            stageOutUnitType = unitMap[respStage.output_units.upper()]
-
-            if stageInUnitType == 'VEL':
-                respStage.zeros.append(ComplexWithUncertainties(0j))
-                A0 = a0_from_pz(respStage.poles, respStage.zeros, out_freq)
-            elif stageInUnitType == 'ACC':
-                respStage.zeros.append(ComplexWithUncertainties(0j))
-                respStage.zeros.append(ComplexWithUncertainties(0j))
-                A0 = a0_from_pz(respStage.poles, respStage.zeros, out_freq)
-            else:
-                A0 = a0_from_pz(respStage.poles, respStage.zeros, out_freq)
-
-            # Convert from Laplace(HERTZ) to Laplace (RAD/S)
-            funcConv = 1.0
+    # Write each response stage to bodyBuf 
+    for respStage in responseStages:
+        stageType = _write_stage(respStage, headerBuf, bodyBuf, out_freq)
 
-            if respStage.pz_transfer_function_type == 'LAPLACE (HERTZ)':
-                funcConv = 2 * pi
-                A0 *= funcConv ** (len(respStage.poles) - len(respStage.zeros))
-            
-            # Set stage info for file
-            t_v_m = 'theoretical'  # set paz, fir, iir stages to theoretical, fap stages to measured
-            stageType = 'paz'
-            stageNum = respStage.stage_sequence_number
-            
-            sourceType, linesOut = get_source_type_from_units(stageInUnitType, stageOutUnitType, stageNum)
-            headerLines = headerLines + linesOut
+        if stageType is not None:
+            extMask |= _EXT_BITS[stageType]
 
-            dataSource = 'obspy response'
+    network = _NET_CANON.get(network, network)
+    location = _LOC_CANON.get(location, location)
+    timeStr = '{}{:03d}'.format(starttime.year, starttime.julday)
+    fileExt = _EXT_TABLE[extMask]
 
-            extensions.append(stageType)
+    fileName = '{}.{}.{}.{}.{}.{}'.format(network, station, channel, location, timeStr, fileExt)
 
-            if respStage.decimation_delay is not None:
-                delays.append(respStage.decimation_delay)
+    # a bare file name is written to the current working directory
+    outpath = os.path.join(dir_path or '', fileName)
 
-            pazLine = '{:<12} {:<2} {:<12} {:<6} {}'.format(t_v_m, stageNum, sourceType, stageType, dataSource)
-            stageLines = stageLines + pazLine + '\n'
+    with open(outpath, 'w', buffering=_WRITE_BUFFER_SIZE) as respFile:
+        respFile.write(headerBuf.getvalue())
+        respFile.write('#\n')
+        respFile.write(bodyBuf.getvalue())
 
-            stageLines = stageLines + f'{A0: 10.6e}' + '\n'
-            
-            numPoles = len(respStage.poles)
-            numZeros = len(respStage.zeros)
-            
-            stageLines = stageLines + str(numPoles) +'\n'
-
-            # pazfir only allows for symmetrical error, get largest error between upper and lower and assign to field in pazfir, probably don't need to do the == case
+    return sensitivity, out_freq, fileName
+    
 
-            for p in respStage.poles:
+def _write_pazfir_args(args):
+    """
+    Call write_pazfir with a tuple of positional and keyword arguments, so it
+    can be mapped over channels by a process pool.
+    """
+    pargs, kwargs = args
+    return write_pazfir(*pargs, **kwargs)
 
-                pReal = p.real * funcConv
-                pImag = p.imag * funcConv
 
-                pRealErr = get_errors_from_obspy_uncertainties(p.real) * funcConv
-                pImagErr = get_errors_from_obspy_uncertainties(p.imag) * funcConv
+def _inventory_channels(invObj, out_freq, dir_path):
+    """
+    Generate the table metadata of each channel in an Inventory, in inventory
+    order, with the write_pazfir arguments for channels that have a response,
+    or None.
+    """
+    for net in invObj.networks:
+        netCode = _NET_CANON.get(net.code, net.code)
+        for sta in net.stations:
+            staCode = sta.code
+            for chan in sta.channels:
+                chanCode = chan.code
+                locCode =chan.location_code
+                startDate = chan.start_date
+                endDate = chan.end_date
                 
-                stageLines = stageLines + f'{pReal:< 15.6e}' + f'{pImag:< 15.6e}' + f'{pRealErr:< 15.6e}' + f'{pImagErr:< 15.6e}' +'\n'
-
-            stageLines = stageLines + str(numZeros) +'\n'
-
-            for z in respStage.zeros:
-                zReal = z.real * funcConv
-                zImag = z.imag * funcConv 
+                # for table formation
+                chanLocCode = chanCode + locCode
+                locOut = _LOC_CANON.get(locCode, locCode)
 
-                zRealErr = get_errors_from_obspy_uncertainties(z.real) * funcConv
-                zImagErr = get_errors_from_obspy_uncertainties(z.imag) * funcConv
+                if startDate is None:
+                    startDate = UTCDateTime(-9999999999.999)
+                    jDate = -1
+                else:
+                    jDate = startDate.year * 1000 + startDate.julday
+                if endDate is None:
+                    endDate =  UTCDateTime(9999999999.999)
                 
-                stageLines = stageLines + f'{zReal:< 15.6e}' + f'{zImag:< 15.6e}' + f'{zRealErr:< 15.6e}' + f'{zImagErr:< 15.6e}' +'\n'
-
-            linesWrite = linesWrite + stageLines
-            respStageLines = get_stationxml_lines(respStage)
-            headerLines = headerLines + respStageLines
-
-
-        elif isinstance(respStage,CoefficientsTypeResponseStage):
-
-            if respStage.cf_transfer_function_type in ['ANALOG (RADIANS/SECOND)','ANALOG (HERTZ)']:
-                raise NotImplementedError('Conversion of CoefficientsTypeResponseStage transfer function of type "{}" to type "DIGITAL" not implemented'.format(respStage.cf_transfer_function_type))
-
-            stageInUnitType = unitMap[respStage.input_units.upper()]
-            stageOutUnitType = unitMap[respStage.output_units.upper()]
-            stageNum = respStage.stage_sequence_number 
-            
-            sourceType, linesOut = get_source_type_from_units(stageInUnitType, stageOutUnitType, stageNum)
-            headerLines = headerLines + linesOut
-
-            numNum = len(respStage.numerator)
-            numDenom = len(respStage.denominator)
-
-            if numNum > 0 and numDenom == 0:
-                stageExt = 'fir'
-                extensions.append(stageExt)
-            elif numNum > 0 and numDenom > 0:
-                stageExt = 'iir'
-                extensions.append(stageExt)
-            else:
-                headerLines = headerLines + '# No coefficients found.  Skipping stage in file, \n# but gain values are accounted for in sensitivity value.\n#\n'
-                respStageLines = get_stationxml_lines(respStage)
-                headerLines = headerLines + respStageLines
-                continue
+                #check if response information exists, if so, a pazfir file is written for it
+                chanResp = chan.response
+                if len(chanResp.response_stages) == 0:
+                    # only the sensor row is needed
+                    yield (staCode, chanLocCode, startDate, endDate, jDate, None, None, None), None
+                    continue
 
-            t_v_m = 'theoretical'  # set paz, fir, iir stages to theoretical, fap stages to measured
-            stageType = stageExt
-            dataSource = 'obspy response'
-
-            decimSampRate = respStage.decimation_input_sample_rate
-
-            if respStage.decimation_delay is not None:
-                delays.append(respStage.decimation_delay)
-
-            firLine = '{:<12} {:<2} {:<12} {:<6} {}'.format(t_v_m, stageNum, sourceType, stageType, dataSource)
-            stageLines = stageLines + firLine + '\n'
-            stageLines = stageLines + f'{decimSampRate: 10.6e}' + '\n'
-            stageLines = stageLines + str(numNum) +'\n'
-
-            for n in respStage.numerator:
-                nErr = zRealErr = get_errors_from_obspy_uncertainties(n)
-                stageLines = stageLines + f'{n:< 15.6e}' f'{nErr:< 15.6e}' + '\n'
-            
-            stageLines = stageLines + str(numDenom) +'\n'
+                sampRate = chan.sample_rate
+                sensorDesc = chan.sensor.description
+                dataLogger = chan.data_logger
+                preAmp = chan.pre_amplifier
+                bandCode = chanCode[0].lower()
 
-            if numDenom > 0:
-                for d in respStage.denominator:
-                    dErr = zRealErr = get_errors_from_obspy_uncertainties(n)
-                    stageLines = stageLines + f'{d:< 15.6e}' f'{dErr:< 15.6e}' + '\n'
+                if sensorDesc is None:
+                    sensorDesc = '-'
 
-            linesWrite = linesWrite + stageLines
-            respStageLines = get_stationxml_lines(respStage)
-            headerLines = headerLines + respStageLines
+                yield (staCode, chanLocCode, startDate, endDate, jDate, bandCode, sampRate, sensorDesc), \
+                      ((chanResp, staCode, chanCode, startDate), \
+                       dict(out_freq=out_freq, dir_path=dir_path, network=netCode, location=locOut, endtime=endDate, \
+                            sample_rate=sampRate, sensor=sensorDesc, data_logger=dataLogger, pre_amplifier=preAmp))
 
-        elif isinstance(respStage,FIRResponseStage):
 
-            numNum = len(respStage.coefficients)
-            
-            if numNum > 0:
-                stageInUnitType = unitMap[respStage.input_units.upper()]
-                stageOutUnitType = unitMap[respStage.output_units.upper()]
-                stageNum = respStage.stage_sequence_number
-                
-                sourceType, linesOut = get_source_type_from_units(stageInUnitType, stageOutUnitType, stageNum)
-                headerLines = headerLines + linesOut
+def _write_table_rows(channelResults, dir_path, write_tables, return_tables):
+    """
+    Make the sensor and instrument rows for each (channel metadata, write_pazfir
+    result or None) pair, writing them to the table files as they're made.
+    Returns the lists of sensor and instrument row tuples, which are empty
+    unless return_tables is True.
+    """
+    # one tuple per table row, in SENSOR_COLUMNS and INSTRUMENT_COLUMNS order
+    sensorRows = []
+    instrumentRows = []
 
-                t_v_m = 'theoretical'  # set paz, fir, iir stages to theoretical, fap stages to measured
-                stageType = 'fir'
-                
-                dataSource = 'obspy response' 
-                
-                extensions.append(stageType)
+    inid = 0
+    chanid = 0
 
-                if respStage.decimation_delay is not None:
-                    delays.append(respStage.decimation_delay)
+    with ExitStack() as tableFiles:
+        if write_tables == True:
+            sensorFile = tableFiles.enter_context(open(os.path.join(dir_path, _TABLE_FORMATS['sensor'][0]), 'w',
+                                                       buffering=_WRITE_BUFFER_SIZE))
+            instrumentFile = tableFiles.enter_context(open(os.path.join(dir_path, _TABLE_FORMATS['instrument'][0]), 'w',
+                                                           buffering=_WRITE_BUFFER_SIZE))
+
+        for (staCode, chanLocCode, startDate, endDate, jDate, bandCode, sampRate, sensorDesc), pazfirResult in channelResults:
+            if pazfirResult is not None:
+                sensitivity, respFreq, fileName = pazfirResult
+
+                # inid, insname, instype, band, digital (d/a), samprate, ncalib, ncalper, dir, dfile, resptype
+                ncalper = 1/respFreq
+                ncalib = 1/sensitivity
+                rspType = fileName.split('.')[-1]
                 
-                decimSampRate = respStage.decimation_input_sample_rate
-
-                firLine = '{:<12} {:<2} {:<12} {:<6} {}'.format(t_v_m, stageNum, sourceType, stageType, dataSource)
-                stageLines = stageLines + firLine + '\n'
-                stageLines = stageLines + f'{decimSampRate: 10.6e}' + '\n'
-                stageLines = stageLines + str(numNum) +'\n'
-
-                for n in respStage.coefficients:
-                    nErr = zRealErr = get_errors_from_obspy_uncertainties(n)
-                    stageLines = stageLines + f'{n:< 15.6e}' f'{nErr:< 15.6e}' + '\n'
+                instrumentRow = (inid, sensorDesc, '-', bandCode, 'd', sampRate, ncalib, ncalper,
+                                 dir_path, fileName, rspType)
+                sensorRow = (staCode, chanLocCode, startDate.timestamp, endDate.timestamp, inid,
+                             chanid, jDate, 1, ncalper, 0, 'y')
+
+                if return_tables:
+                    instrumentRows.append(instrumentRow)
+                if write_tables == True:
+                    instrumentFile.write(_format_instrument_row(*instrumentRow))
                 
-                stageLines = stageLines + '0' +'\n'
-
-                linesWrite = linesWrite + stageLines
-                respStageLines = get_stationxml_lines(respStage)
-                headerLines = headerLines + respStageLines
+                inid += 1
 
             else:
-                headerLines = headerLines + '# No coefficients found.  Skipping stage in file, \n# but gain values are accounted for in sensitivity value.\n#\n'
-                respStageLines = get_stationxml_lines(respStage)
-                headerLines = headerLines + respStageLines
-                continue
-
-        elif isinstance(respStage,ResponseListResponseStage):
-            
-            stageInUnitType = unitMap[respStage.input_units.upper()]
-            stageOutUnitType = unitMap[respStage.output_units.upper()]
-
-            t_v_m = 'theoretical'  # set paz, fir, iir stages to theoretical, fap stages to measured
-            stageType = 'fap'
-            stageNum = respStage.stage_sequence_number
-
-            sourceType, linesOut = get_source_type_from_units(stageInUnitType, stageOutUnitType, stageNum)
-            headerLines = headerLines + linesOut
-
-            dataSource = 'obspy response'
-
-            extensions.append(stageType)
-
-            if respStage.decimation_delay is not None:
-                delays.append(respStage.decimation_delay)
-
-            fapLine = '{:<12} {:<2} {:<12} {:<6} {}'.format(t_v_m, stageNum, sourceType, stageType, dataSource)
-            stageLines = stageLines + fapLine + '\n'
-
-            fapNum = len(respStage.response_list_elements)
-            stageLines = stageLines + str(fapNum) +'\n'
+                sensorRow = (staCode, chanLocCode, startDate.timestamp, endDate.timestamp, inid,
+                             chanid, jDate, 1, -1, 0, 'y')
 
-            for e in respStage.response_list_elements:
-                freq = e.frequency
-                amp = e.amplitude
-                pha = e.phase
-                
-                aErr = get_errors_from_obspy_uncertainties(e.amplitude)
-                pErr = get_errors_from_obspy_uncertainties(e.phase)
-                
-                stageLines = stageLines + f'{freq:<12.8f}' + f'{amp:<12.8f}' + f'{pha:< 13.8f}' + f'{aErr:<12.8f}' + f'{pErr:<12.8f}' + '\n'
+            if return_tables:
+                sensorRows.append(sensorRow)
+            if write_tables == True:
+                sensorFile.write(_format_sensor_row(*sensorRow))
             
-            linesWrite = linesWrite + stageLines
-            respStageLines = get_stationxml_lines(respStage)
-            headerLines = headerLines + respStageLines
-
-        elif isinstance(respStage, PolynomialResponseStage):
-            raise TypeError('Pazfir file spec does not support Polynomial Responses')
-
-        elif isinstance(respStage, ResponseStage):
-            headerLines = headerLines + 'Generic Obspy ResponseStage object in StationXML File. \n# Does not contribute to pazfir type response. \n'
-            respStageLines = get_stationxml_lines(respStage)
-            headerLines = headerLines + respStageLines
-        
-        else:
-            wrongStage = respStage.__class__.__name__
-            raise TypeError('Unsupported Stage Type: {}'.format(wrongStage))
-        
-    linesWrite = headerLines + '#\n'+ linesWrite
-    
-    if network == 'UKNOWN': network = '__'
-    if location == 'N/A': location = ''
-    timeStr = starttime.strftime('%Y%j')
-    extSet = set(extensions)
-    uniqueExt = list(extSet)
-    fileExt = ''
-    if 'paz' in uniqueExt:
-        fileExt = fileExt + 'paz'
-    if 'fir' in uniqueExt:
-        fileExt = fileExt + 'fir'
-    if 'iir' in uniqueExt:
-        fileExt = fileExt + 'iir'
-    if 'fap' in uniqueExt:
-        fileExt = fileExt + 'fap'
-
-    fileName = '{}.{}.{}.{}.{}.{}'.format(network, station, channel, location, timeStr, fileExt)
-
-    if dir_path is None:
-        dir_path = os.getcwd()
+            chanid +=1
 
-    if dir_path[-1] == '/':
-        outpath = '{}{}'.format(dir_path,fileName)
-    else:
-        outpath = '{}/{}'.format(dir_path,fileName)
-
-    respFile = open(outpath,'w')
-    # for respLine in linesWrite:
-    respFile.write(linesWrite)
-    respFile.close()
+    return sensorRows, instrumentRows
 
-    return sensitivity, out_freq, fileName
-    
 
-def sxml2pazfir(input_xml, out_freq=None, dir_path = None, write_tables = True):
+def sxml2pazfir(input_xml, out_freq=None, dir_path = None, write_tables = True, max_workers = 1,
+                return_tables = True):
     """
     Takes a StationXML file or an ObsPy Inventory object and writes out a pazfir style file
     for every response contained within the file/object as well as writes optional sensor and 
@@ -1482,6 +1705,14 @@ def sxml2pazfir(input_xml, out_freq=None, dir_path = None, write_tables = True):
        'instrument.txt', formatted according to the KBCore spec will be written to the output
         directory.  If false, no sensor or instrument tables will be written, but the pazfir 
         files will be.
+    max_workers: integer
+        Default is 1.  Number of processes used to write the pazfir files.  If 1, the
+        files are written one after another in the current process.  If None, the
+        number of processors on the machine is used.
+    return_tables: boolean
+        Default is True.  If True, the sensor and instrument rows are also kept in memory
+        and returned as dictionaries.  If False, (None, None) is returned, and rows are
+        only written to the table files, so memory use doesn't grow with the inventory.
 
     Returns
     -------
@@ -1507,80 +1738,33 @@ def sxml2pazfir(input_xml, out_freq=None, dir_path = None, write_tables = True):
     else:
         invObj = input_xml
 
+    # resolve the output directory once, as it is recorded in every instrument row
     if dir_path is None:
         dir_path = os.getcwd()
     
-    inid = 0
-    chanid = 0
-
-    # sta, chan, time, endtime, inid, chanid, jdate, calratio, calper, thsift (clock errors), instant
-    sensorDict = {'tablename':'sensor', 'sta':[], 'chan':[], 'time':[], 'endtime':[], 'inid':[], 'chanid':[], \
-                  'jdate':[], 'calratio':[], 'calper':[], 'tshift':[], 'instant':[]}
-     # inid, insname, instype, band, digital (d/a), samprate, ncalib, ncalper, dir, dfile, rsptype
-    instrumentDict = {'tablename':'instrument','inid':[], 'insname':[], 'instype':[], 'band':[], 'digital':[], \
-                     'samprate':[], 'ncalib':[], 'ncalper':[], 'dir':[], 'dfile':[], 'rsptype':[]} 
-
-    for net in invObj.networks:
-        netCode = net.code
-        for sta in net.stations:
-            staCode = sta.code
-            for chan in sta.channels:
-                chanCode = chan.code
-                locCode =chan.location_code
-                sampRate = chan.sample_rate
-                sensorDesc = chan.sensor.description
-                startDate = chan.start_date
-                endDate = chan.end_date
-                dataLogger = chan.data_logger
-                preAmp = chan.pre_amplifier
-                
-                # for table formation
-                chanLocCode = chanCode + locCode
-                bandCode = chanCode[0].lower()
-                jDate = int(startDate.strftime('%Y%j'))
-
-                if sensorDesc is None:
-                    sensorDesc = '-'
-
-                if startDate is None:
-                    startDate = UTCDateTime(-9999999999.999)
-                    jDate 
-                if endDate is None:
-                    endDate =  UTCDateTime(9999999999.999)
-                
-                #check if response information exists, if so, go into response loop
-                if len(chan.response.response_stages) > 0: 
-                    sensitivity, out_freq, fileName =  write_pazfir(chan.response, staCode, chanCode, startDate, out_freq = out_freq, dir_path = dir_path, network=netCode, location=locCode, \
-                                                          endtime=endDate, sample_rate=sampRate, sensor=sensorDesc, data_logger=dataLogger, pre_amplifier=preAmp)
-
-                    # inid, insname, instype, band, digital (d/a), samprate, ncalib, ncalper, dir, dfile, resptype
-                    ncalper = 1/out_freq
-                    ncalib = 1/sensitivity
-                    rspType = fileName.split('.')[-1]
-                    
-                    instrumentDict['inid'].append(inid); instrumentDict['insname'].append(sensorDesc)
-                    instrumentDict['instype'].append('-'), instrumentDict['band'].append(bandCode); instrumentDict['digital'].append('d')
-                    instrumentDict['samprate'].append(sampRate); instrumentDict['ncalib'].append(ncalib); instrumentDict['ncalper'].append(ncalper)
-                    instrumentDict['dir'].append(dir_path), instrumentDict['dfile'].append(fileName); instrumentDict['rsptype'].append(rspType)
-                   
-                    sensorDict['sta'].append(staCode); sensorDict['chan'].append(chanLocCode)
-                    sensorDict['time'].append(startDate.timestamp); sensorDict['endtime'].append(endDate.timestamp); sensorDict['inid'].append(inid)
-                    sensorDict['chanid'].append(chanid); sensorDict['jdate'].append(jDate); sensorDict['calratio'].append(1)
-                    sensorDict['calper'].append(ncalper); sensorDict['tshift'].append(0); sensorDict['instant'].append('y')
-                    
-                    inid += 1
-                    chanid +=1
+    channels = _inventory_channels(invObj, out_freq, dir_path)
 
-                else:
-                    sensorDict['sta'].append(staCode); sensorDict['chan'].append(chanLocCode)
-                    sensorDict['time'].append(startDate.timestamp); sensorDict['endtime'].append(endDate.timestamp); sensorDict['inid'].append(inid)
-                    sensorDict['chanid'].append(chanid); sensorDict['jdate'].append(jDate); sensorDict['calratio'].append(1)
-                    sensorDict['calper'].append(-1); sensorDict['tshift'].append(0); sensorDict['instant'].append('y')
-                    
-                    chanid +=1
-
-    if write_tables == True:
-        write_dict_to_flatfile(sensorDict, dir_path)
-        write_dict_to_flatfile(instrumentDict, dir_path)
+    # each response is written to its own file, so they can be written in parallel
+    if max_workers == 1:
+        # each channel's file is written just before its table rows
+        channelResults = ((channel, _write_pazfir_args(args) if args else None)
+                          for channel, args in channels)
+        sensorRows, instrumentRows = _write_table_rows(channelResults, dir_path, write_tables,
+                                                       return_tables)
+    else:
+        channels = list(channels)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # results come back in order, and rows are written as they arrive
+            pazfirResults = executor.map(_write_pazfir_args, [args for _, args in channels if args])
+            channelResults = ((channel, next(pazfirResults) if args else None)
+                              for channel, args in channels)
+            sensorRows, instrumentRows = _write_table_rows(channelResults, dir_path, write_tables,
+                                                           return_tables)
+
+    if not return_tables:
+        return None, None
+
+    sensorDict = _rows_to_table_dict('sensor', SENSOR_COLUMNS, sensorRows)
+    instrumentDict = _rows_to_table_dict('instrument', INSTRUMENT_COLUMNS, instrumentRows)
 
     return sensorDict, instrumentDict
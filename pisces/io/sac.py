@@ -21,15 +21,19 @@ Converts a SAC header dictionary into a list of table dictionaries and vice-vers
 
 import sys
 import os
-from collections import OrderedDict
 import functools
-
-from obspy.core import UTCDateTime, AttribDict
+import operator
+import struct
+from calendar import isleap
+from datetime import date
+
+import numpy as np
+from obspy.core import AttribDict, UTCDateTime
+from obspy.io.sac.header import FLOATHDRS, INTHDRS, STRHDRS
 import obspy.geodetics as geod
 
 import pisces.tables.kbcore as kb
-from pisces.io.readwaveform import read_waveform
-from pisces.io.util import _map_header, _buildhdr
+from pisces.io.util import EPOCH_ORDINAL, _epoch_to_jdate, _make_buildhdr
 
 # ObsPy default values
 OBSPYDEFAULT = {'network': '',
@@ -49,7 +53,7 @@ SACDEFAULT = {'a': FDEFAULT, 'az': FDEFAULT, 'b': FDEFAULT, 'baz': FDEFAULT,
               'depmax': FDEFAULT, 'depmen': FDEFAULT, 'depmin': FDEFAULT,
               'dist': FDEFAULT, 'e': FDEFAULT, 'evdp': FDEFAULT, 'evla': FDEFAULT,
               'evlo': FDEFAULT, 'f': FDEFAULT, 'gcarc': FDEFAULT, 'idep': IDEFAULT,
-              'ievreg': IDEFAULT, 'ievtype': IDEFAULT, 'iftype': IDEFAULT,
+              'ievreg': IDEFAULT, 'ievtyp': IDEFAULT, 'iftype': IDEFAULT,
               'iinst': IDEFAULT, 'imagsrc': IDEFAULT, 'imagtyp': IDEFAULT,
               'int1': FDEFAULT, 'iqual': IDEFAULT, 'istreg': IDEFAULT,
               'isynth': IDEFAULT, 'iztype': IDEFAULT, 'ka': SDEFAULT,
@@ -82,6 +86,18 @@ SACDEFAULT = {'a': FDEFAULT, 'az': FDEFAULT, 'b': FDEFAULT, 'baz': FDEFAULT,
 # Decorator functions allow readable, reusable handling of header values.
 
 
+def _compose(original_func, prepare):
+    """
+    A single function doing original_func(prepare(hdr)), carrying the name and
+    docstring of original_func.  prepare is usually a builtin, like int or
+    str.strip, so the composition adds only one Python call.
+
+    """
+    def converter(hdr):
+        return original_func(prepare(hdr))
+    return functools.update_wrapper(converter, original_func)
+
+
 def cast_to_int(original_func):
     """
     Cast a function's argument to int before the function operates on it, like:
@@ -95,10 +111,7 @@ def cast_to_int(original_func):
     12
 
     """
-    @functools.wraps(original_func)
-    def converter(hdr):
-        return original_func(int(hdr))
-    return converter
+    return _compose(original_func, int)
 
 
 def cast_to_float(original_func):
@@ -116,15 +129,12 @@ def cast_to_float(original_func):
     # not numpy.float32
 
     """
-    @functools.wraps(original_func)
-    def converter(hdr):
-        return original_func(float(hdr))
-    return converter
+    return _compose(original_func, float)
 
 
 def strip_string(original_func):
     """
-    Strip white space from a function's argument to float before the function
+    Strip white space from a function's argument before the function
     operates on it, like:
 
     Examples
@@ -132,22 +142,17 @@ def strip_string(original_func):
     >>> @strip_string
     ... def kcmpnm_to_chan(kcmpnm):
     ...     return kcmpnm[:6]
-    >>> kclmpnm_to_chan(' my_too_long_component ')
+    >>> kcmpnm_to_chan(' my_too_long_component ')
     'my_too'
 
     """
-    @functools.wraps(original_func)
-    def converter(hdr):
-        return original_func(int(hdr))
-    return converter
+    return _compose(original_func, str.strip)
 
 
 def truncate_string(N):
     def make_func(original_func):
-        @functools.wraps(original_func)
-        def func_wrapper(val):
-            return val[:N]
-        return func_wrapper
+        return _compose(original_func, operator.itemgetter(slice(N)))
+    return make_func
 
 
 # decorator for when you find default/null SAC header values
@@ -155,13 +160,40 @@ def truncate_string(N):
 # XXX: not clear how this could be used with other decorators
 def swap_if_value(detected_value, return_value):
     def check_value(original_func):
+        @functools.wraps(original_func)
         def func_wrapper(arg):
             if arg == detected_value:
                 out = return_value
             else:
-                out = arg
+                out = original_func(arg)
             return out
         return func_wrapper
+    return check_value
+
+
+def memoize_by_headers(hdrmap, maxsize=4096):
+    """
+    Cache the rows of a sachdr2* function that only reads the header fields in
+    hdrmap, keyed by those fields' values.  Traces from the same station share
+    these fields, so bulk conversions mostly hit the cache.  Each call still
+    returns new row dictionaries.
+
+    """
+    hdrs = tuple(hdr for hdr, col, default in hdrmap)
+
+    def decorator(original_func):
+        @functools.lru_cache(maxsize=maxsize)
+        def cached(values):
+            rows = original_func(dict(zip(hdrs, values)))
+            return tuple(tuple(row.items()) for row in rows)
+
+        @functools.wraps(original_func)
+        def func_wrapper(header):
+            return [dict(row) for row in cached(tuple(header.get(hdr) for hdr in hdrs))]
+        func_wrapper.cache_clear = cached.cache_clear
+        return func_wrapper
+
+    return decorator
 
 
 # ############################## STRING HEADER CONVERSIONS ####################
@@ -204,7 +236,7 @@ def net_to_knetwk(net):
 
 
 def sta_to_kstnm(sta):
-    return kstnm
+    return sta
 
 
 # ############################## INT HEADER CONVERSIONS #######################
@@ -237,7 +269,7 @@ ETYPEDICT = {37: 'en', 38: 'ex', 39: 'ex', 40: 'qt', 41: 'qt', 42: 'qt',
              83: 'mc'}
 
 # evtype -> ievtyp
-IEVTYPDICT = dict((_val, _key) for _key, _val in ETYPEDICT.items())
+IEVTYPDICT = {_val: _key for _key, _val in ETYPEDICT.items()}
 #
 # imagsrc -> auth
 AUTHDICT = {58: 'ISC:NEIC', 61: 'PDE', 62: 'ISC', 63: 'REB-ICD',
@@ -245,7 +277,11 @@ AUTHDICT = {58: 'ISC:NEIC', 61: 'PDE', 62: 'ISC', 63: 'REB-ICD',
             68: 'IEVLOC', 69: 'IJSOP', 70: 'IUSER', 71: 'IUNKNOWN'}
 #
 # auth -> imagsrc
-IMAGSRCDICT = dict((_val, _key) for _key, _val in AUTHDICT.items())
+IMAGSRCDICT = {_val: _key for _key, _val in AUTHDICT.items()}
+#
+# imagtyp -> magnitude column
+MAGDICT = {52: 'mb', 53: 'ms', 54: 'ml'}
+MAGTYPES = frozenset(MAGDICT.values())
 
 
 # SAC -> CSS
@@ -260,6 +296,32 @@ def ievtyp_to_etype(ievtyp):
 
 # the following functions accept a SAC header dictionary, and return respective
 # kbcore table instances, assumes default SAC header values set to None
+@functools.lru_cache(maxsize=4096)
+def _reftime_ns(yr, jday, hour, minute, second, msec):
+    """
+    Epoch nanoseconds from SAC "nz" reference time fields, using integer
+    arithmetic instead of the slower UTCDateTime keyword constructor.
+    Results are cached, as files from one event or day share reference times.
+    Two-digit years are taken as 19xx.
+
+    Raises ValueError for out-of-range fields, such as -12345 null values.
+
+    """
+    # header values may be numpy integers, which would overflow below
+    yr, jday, hour, minute, second, msec = (int(yr), int(jday), int(hour), int(minute),
+                                            int(second), int(msec))
+    if 0 <= yr <= 99:
+        yr += 1900
+    if not (1 <= jday <= 365 + isleap(yr) and 0 <= hour < 24 and 0 <= minute < 60
+            and 0 <= second < 60 and 0 <= msec < 1000):
+        raise ValueError("Invalid time fields.")
+
+    days = date(yr, 1, 1).toordinal() - EPOCH_ORDINAL + jday - 1
+    seconds = ((days * 24 + hour) * 60 + minute) * 60 + second
+
+    return (seconds * 1000 + msec) * 1000000
+
+
 def get_sac_reftime(header):
     """
     Get SAC header reference time as a UTCDateTime instance from a SAC header
@@ -277,21 +339,19 @@ def get_sac_reftime(header):
 
     # TODO: let null nz values be 0?
     try:
+        # two-digit years are handled in the cached _reftime_ns
         yr = header['nzyear']
-        if 0 <= yr <= 99:
-            yr += 1900
         nzjday = header['nzjday']
         nzhour = header['nzhour']
         nzmin = header['nzmin']
         nzsec = header['nzsec']
         nzmsec = header['nzmsec']
     except KeyError as e:
-        msg = "Not enough time information: {}".format(e.message)
+        msg = "Not enough time information: {}".format(e)
         raise KeyError(msg)
 
     try:
-        reftime = UTCDateTime(year=yr, julday=nzjday, hour=nzhour, minute=nzmin,
-                              second=nzsec, microsecond=nzmsec * 1000)
+        reftime = UTCDateTime(ns=_reftime_ns(yr, nzjday, nzhour, nzmin, nzsec, nzmsec))
         # reftime = datetime.datetime(yr, 1, 1, nzhour, nzmin, nzsec, nzmsec * 1000) + \
         #                            datetime.timedelta(int(nzjday-1))
         # NOTE: epoch seconds can be got by:
@@ -304,67 +364,176 @@ def get_sac_reftime(header):
     return reftime
 
 
-def _cast_int(d, keys):
-    for key in keys:
-        try:
-            d[key] = int(d[key])
-        except (TypeError, KeyError):
-            # no key, or int(None)
-            pass
+# binary SAC header: 70 floats, 40 ints, then 8-character strings, except for
+# the 16-character kevnm.  ObsPy names the second half of kevnm "kevnm2".
+SAC_HEADER_SIZE = 632
+_SAC_HDRS = FLOATHDRS + INTHDRS + STRHDRS
+_SAC_FORMAT = '70f40i' + '8s' * len(STRHDRS)
+_SAC_STRUCTS = {'<': struct.Struct('<' + _SAC_FORMAT), '>': struct.Struct('>' + _SAC_FORMAT)}
+_NVHDR = len(FLOATHDRS) + INTHDRS.index('nvhdr')
 
-    return d
 
+def get_sac_byteorder(buf):
+    """
+    Get the byte order of a binary SAC header from its header version.
 
-def _cast_float(d, keys):
-    for key in keys:
-        try:
-            d[key] = float(d[key])
-        except (TypeError, KeyError):
-            # no key, or int(None)
-            pass
+    Parameters
+    ----------
+    buf : bytes-like
+        At least the first 632 bytes of a SAC file.
+
+    Returns
+    -------
+    str
+        '<' for little-endian, '>' for big-endian.
 
-    return d
+    Raises
+    ------
+    ValueError
+        buf is too short or doesn't have a sensible SAC header version.
 
+    """
+    if len(buf) < SAC_HEADER_SIZE:
+        raise ValueError("Expected at least {} bytes.".format(SAC_HEADER_SIZE))
 
-def _clean_str(d, keys):
-    for key in keys:
-        try:
-            d[key] = d[key].strip()
-        except (KeyError, AttributeError):
-            # no key, None.strip()
-            pass
+    for byteorder in '<>':
+        # nvhdr is a small positive integer, so it tells the byte order
+        nvhdr, = struct.unpack_from(byteorder + 'i', buf, 4 * _NVHDR)
+        if 0 < nvhdr < 20:
+            return byteorder
+
+    raise ValueError("Not a SAC header, or unknown header version.")
+
+
+def parse_sac_binary_header(buf):
+    """
+    Unpack a binary SAC header into a header dictionary, like the one ObsPy
+    makes with debug_headers=True, in a single struct unpack.
+
+    Parameters
+    ----------
+    buf : bytes-like
+        At least the first 632 bytes of a SAC file, little- or big-endian.
+
+    Returns
+    -------
+    dict
+        SAC header names and values, with strings cleaned like ObsPy does,
+        but not stripped.  Feed it to sachdr2tables.
+
+    Raises
+    ------
+    ValueError
+        buf is too short or doesn't have a sensible SAC header version.
+
+    Examples
+    --------
+    >>> with open('file.sac', 'rb') as f:
+    ...     header = parse_sac_binary_header(f.read(SAC_HEADER_SIZE))
+    >>> tables = sachdr2tables(header)
+
+    """
+    vals = _SAC_STRUCTS[get_sac_byteorder(buf)].unpack_from(buf)
+    header = dict(zip(_SAC_HDRS, vals))
+
+    # like ObsPy, drop trailing nulls, pad out anything after a null character,
+    # use '?' for non-ASCII characters, and make anything starting with -12345 null
+    for hdr in STRHDRS:
+        val = header[hdr].rstrip(b'\x00').decode('ascii', 'replace').replace('\ufffd', '?')
+        null_term = val.find('\x00')
+        if null_term >= 0:
+            val = val[:null_term] + ' ' * (len(val) - null_term)
+        header[hdr] = SDEFAULT if val.startswith('-12345') else val
+
+    header['kevnm'] += header.pop('kevnm2')
+
+    return header
+
+
+# simple SAC header -> table column translations, as (hdr, col, default) triples
+def _with_defaults(*pairs):
+    return tuple((hdr, col, SACDEFAULT[hdr]) for hdr, col in pairs)
+
+
+SAC_SITE = _with_defaults(('kstnm', 'sta'),
+                          ('stla', 'lat'),
+                          ('stlo', 'lon'),
+                          ('stel', 'elev'))
+SAC_ARRAYSITE = _with_defaults(('kstnm', 'sta'),
+                               ('stla', 'lat'),
+                               ('stlo', 'lon'),
+                               ('stel', 'elev'),
+                               ('user7', 'deast'),
+                               ('user8', 'dnorth'))
+SAC_SITECHAN = _with_defaults(('kstnm', 'sta'),
+                              ('kcmpnm', 'chan'),
+                              ('cmpaz', 'hang'),
+                              ('cmpinc', 'vang'),
+                              ('stdp', 'edepth'))
+SAC_AFFILIATION = _with_defaults(('knetwk', 'net'),
+                                 ('kstnm', 'sta'))
+SAC_INSTRUMENT = _with_defaults(('kinst', 'insname'),
+                                ('iinst', 'instype'),
+                                ('delta', 'samprate'))
+SAC_ORIGIN = _with_defaults(('evla', 'lat'),
+                            ('evlo', 'lon'),
+                            ('norid', 'orid'),
+                            ('nevid', 'evid'),
+                            ('ievreg', 'grn'),
+                            ('evdp', 'depth'))
+SAC_EVENT = _with_defaults(('nevid', 'evid'),
+                           ('kevnm', 'evname'))
+SAC_ASSOC = _with_defaults(('az', 'esaz'),
+                           ('baz', 'seaz'),
+                           ('gcarc', 'delta'))
+
+# distinguishes a missing header from one explicitly set to None
+_NULL = object()
+
+
+def _pull(header, hdrmap):
+    """
+    Build a row dictionary from a (hdr, col, default) map with one lookup per
+    header.  Missing headers and headers at their SAC default become None.
+
+    """
+    get = header.get
+    vals = [get(hdr, _NULL) for hdr, col, default in hdrmap]
 
-    return d
+    return {col: None if val is _NULL or val == default else val
+            for (hdr, col, default), val in zip(hdrmap, vals)}
 
 
+def _nonempty(row):
+    """
+    A one-row list for a table dictionary, or an empty list if all of its
+    values are None, so tables without information are omitted.
+
+    Converters whose rows always have a value, like sta, skip this check.
+
+    """
+    # counting in C is faster than a generator over the values
+    return [row] if list(row.values()).count(None) < len(row) else []
+
+
+@memoize_by_headers(SAC_SITE)
 def sachdr2site(header):
     """
     Provide a SAC header dictionary, get a site table dictionary.
 
     """
-    sac_site = [('kstnm', 'sta'),
-                ('stla', 'lat'),
-                ('stlo', 'lon'),
-                ('stel', 'elev')]
-
-    sitedict = {}
-    for hdr, col in sac_site:
-        val = header.get(hdr, None)
-        sitedict[col] = val if val != SACDEFAULT[hdr] else None
+    sitedict = _pull(header, SAC_SITE)
 
     # clean up
-    try:
+    for col in ('lat', 'lon', 'elev'):
+        if sitedict[col] is not None:
+            sitedict[col] = float(sitedict[col])
+    if sitedict['elev'] is not None:
         sitedict['elev'] /= 1000.0
-    except (TypeError, KeyError):
-        # no 'elev'
-        pass
-
-    sitedict = _cast_float(sitedict, ['lat', 'lon', 'elev'])
-    sitedict = _clean_str(sitedict, ['sta'])
 
     sitedict['sta'] = sitedict['sta'].strip()[:6]
 
-    return [sitedict] or []
+    return [sitedict]
 
 
 def sachdr2arraysite(header):
@@ -379,31 +548,18 @@ def sachdr2arraysite(header):
     with SAC expectations).
 
     """
-    sac_site = [('kstnm', 'sta'),
-                ('stla', 'lat'),
-                ('stlo', 'lon'),
-                ('stel', 'elev'),
-                ('user7','deast'),
-                ('user8','dnorth')]
-
-    sitedict = {}
-    for hdr, col in sac_site:
-        val = header.get(hdr, None)
-        sitedict[col] = val if val != SACDEFAULT[hdr] else None
+    sitedict = _pull(header, SAC_ARRAYSITE)
 
     # clean up
-    try:
+    for col in ('lat', 'lon', 'elev', 'deast', 'dnorth'):
+        if sitedict[col] is not None:
+            sitedict[col] = float(sitedict[col])
+    if sitedict['elev'] is not None:
         sitedict['elev'] /= 1000.0
-    except (TypeError, KeyError):
-        #no 'elev'
-        pass
-
-    sitedict = _cast_float(sitedict, ['lat', 'lon', 'elev', 'deast', 'dnorth'])
-    sitedict = _clean_str(sitedict, ['sta'])
 
     sitedict['sta'] = sitedict['sta'].strip()[:6]
 
-    return [sitedict] or []
+    return [sitedict]
 
 
 def sachdr2sitechan(header):
@@ -411,67 +567,45 @@ def sachdr2sitechan(header):
     Provide a sac header dictionary, get a sitechan table dictionary.
 
     """
-    sac_sitechan = [('kstnm', 'sta'),
-                    ('kcmpnm', 'chan'),
-                    ('cmpaz', 'hang'),
-                    ('cmpinc', 'vang'),
-                    ('stdp', 'edepth')]
+    sitechandict = _pull(header, SAC_SITECHAN)
 
-    sitechandict = AttribDict()
-    for hdr, col in sac_sitechan:
-        val = header.get(hdr, None)
-        sitechandict[col] = val if val != SACDEFAULT[hdr] else None
-
-    try:
+    for col in ('hang', 'vang', 'edepth'):
+        if sitechandict[col] is not None:
+            sitechandict[col] = float(sitechandict[col])
+    if sitechandict['edepth'] is not None:
         sitechandict['edepth'] /= 1000.0
-    except (TypeError, KeyError):
-        # edepth is None or missing
-        pass
 
-    sitechandict = _cast_float(sitechandict, ['hang', 'vang', 'edepth'])
-    sitechandict = _clean_str(sitechandict, ['sta', 'chan'])
+    if sitechandict['chan'] is not None:
+        sitechandict['chan'] = sitechandict['chan'].strip()
     sitechandict['sta'] = sitechandict['sta'].strip()[:6]
 
-    return [sitechandict] or []
+    return [sitechandict]
 
 
+@memoize_by_headers(SAC_AFFILIATION)
 def sachdr2affiliation(header):
-    sac_affil = [('knetwk', 'net'),
-                 ('kstnm', 'sta')]
-
-    affildict = AttribDict()
-    for hdr, col in sac_affil:
-        val = header.get(hdr, None)
-        affildict[col] = val if val != SACDEFAULT[hdr] else None
-
-    affildict = _clean_str(affildict, ['net', 'sta'])
+    affildict = _pull(header, SAC_AFFILIATION)
 
+    if affildict['net'] is not None:
+        affildict['net'] = affildict['net'].strip()
     affildict['sta'] = affildict['sta'].strip()[:6]
 
-    return [affildict] or []
+    return [affildict]
 
 
+@memoize_by_headers(SAC_INSTRUMENT)
 def sachdr2instrument(header):
     # TODO: investigate hdr['resp0-9'] values
-    sac_instr = [('kinst', 'insname'),
-                 ('iinst', 'instype'),
-                 ('delta', 'samprate')]
-
-    instrdict = AttribDict()
-    for hdr, col in sac_instr:
-        val = header.get(hdr, None)
-        instrdict[col] = val if val != SACDEFAULT[hdr] else None
+    instrdict = _pull(header, SAC_INSTRUMENT)
 
     # clean up
-    try:
+    if instrdict['samprate'] is not None:
         instrdict['samprate'] = int(round(1.0 / instrdict['samprate'], 0))
-    except (TypeError, KeyError):
-        pass
 
-    return [instrdict] or []
+    return _nonempty(instrdict)
 
 
-def sachdr2origin(header):
+def sachdr2origin(header, reftime=None):
     """
     Provide a sac header dictionary, get a filled origin table dictionary.
     A few things:
@@ -489,102 +623,106 @@ def sachdr2origin(header):
      * IBRK -> ISC:BERK
      * IUSGS, ICALTECH, ILLNL, IEVLOC, IJSOP, IUSER, IUNKNOWN -> unchanged
 
+    If the SAC reference time is already known, it can be passed in as reftime
+    instead of being recomputed from the header.
+
     """
     # simple SAC translations
-    sac_origin = [('evla', 'lat'),
-                  ('evlo', 'lon'),
-                  ('norid', 'orid'),
-                  ('nevid', 'evid'),
-                  ('ievreg', 'grn'),
-                  ('evdp', 'depth')]
-
-    origindict = AttribDict()
-    for hdr, col in sac_origin:
-        val = header.get(hdr, None)
-        origindict[col] = val if val != SACDEFAULT[hdr] else None
+    origindict = _pull(header, SAC_ORIGIN)
 
     # depth
-    try:
+    for col in ('lat', 'lon', 'depth'):
+        if origindict[col] is not None:
+            origindict[col] = float(origindict[col])
+    if origindict['depth'] is not None:
         origindict['depth'] /= 1000.0
-    except (TypeError, KeyError):
-        # evdp is None or mising
-        pass
+    for col in ('evid', 'orid'):
+        if origindict[col] is not None:
+            origindict[col] = int(origindict[col])
 
     # etype translations
-    edict = {37: 'en', 38: 'ex', 39: 'ex', 40: 'qt', 41: 'qt', 42: 'qt',
-             43: 'ec', 72: 'me', 73: 'me', 74: 'me', 75: 'me', 76: 'mb',
-             77: 'qt', 78: 'qt', 79: 'qt', 80: 'ex', 81: 'ex', 82: 'en',
-             83: 'mc'}
-    try:
-        origindict['etype'] = edict[header['ievtype']]
-    except (TypeError, KeyError):
-        # ievtyp is None, or not a key in edict
-        pass
+    # ievtyp is None, or not a key in ETYPEDICT
+    etype = ETYPEDICT.get(header.get('ievtyp'))
+    if etype is not None:
+        origindict['etype'] = etype
 
     # 1:
-    try:
-        t = get_sac_reftime(header)
-        if header['iztype'] == 11:
-            # reference time is an origin time
-            o = header.get('o', None)
-            o = o if (o != SACDEFAULT['o']) else 0.0
+    if header.get('iztype') == 11:
+        # reference time is an origin time
+        try:
+            t = reftime if reftime is not None else get_sac_reftime(header)
+        except (ValueError, KeyError):
+            # missing or invalid nz time headers
+            t = None
+
+        if t is not None:
+            o = header.get('o')
+            o = float(o) if (o != FDEFAULT) else 0.0
 
             origindict['time'] = t.timestamp - o
-            origindict['jdate'] = int((t - o).strftime('%Y%j'))
-    except (ValueError, KeyError):
-        # no trace.stats.sac, no iztype
-        pass
+            origindict['jdate'] = _epoch_to_jdate(origindict['time'])
 
     # 2: magnitude
-    magdict = {52: 'mb', 53: 'ms', 54: 'ml'}
-    try:
-        origindict[magdict[header['imagtyp']]] = header['mag']
-    except (ValueError, KeyError):
-        # imagtyp is None or not a key in magdict
-        pass
+    # imagtyp is None or not a key in MAGDICT
+    magtype = MAGDICT.get(header.get('imagtyp'))
+    if magtype is not None and 'mag' in header:
+        origindict[magtype] = header['mag']
 
     # is kuser0 is a recognized magnitude type, overwrite mag
     # XXX: this is a LANL wfdisc2sac thing
-    try:
-        magtype = header['kuser0'].strip()
-        if magtype in list(magdict.values()):
-            origindict[magtype] = header['user0']
-    except (KeyError, ValueError):
-        # kuser0 is None
-        pass
+    kuser0 = header.get('kuser0')
+    if kuser0 is not None and kuser0.strip() in MAGTYPES and 'user0' in header:
+        origindict[kuser0.strip()] = header['user0']
 
     # 3: origin author
-    authdict = {58: 'ISC:NEIC', 61: 'PDE', 62: 'ISC', 63: 'REB-ICD',
-                64: 'IUSGS', 65: 'ISC:BERK', 66: 'ICALTECH', 67: 'ILLNL',
-                68: 'IEVLOC', 69: 'IJSOP', 70: 'IUSER', 71: 'IUNKNOWN'}
-    try:
-        origindict['auth'] = authdict[header['imagsrc']]
-    except (KeyError, ValueError):
-        # imagsrc not in authdict (i.e. sac default value)
-        pass
+    # imagsrc not in AUTHDICT (i.e. sac default value)
+    auth = AUTHDICT.get(header.get('imagsrc'))
+    if auth is not None:
+        origindict['auth'] = auth
 
     # XXX: this is LANL wfdisc2sac thing.  maybe turn it off?
-    if header.get('kuser1'):
-        origindict['auth'] = header['kuser1']
+    kuser1 = header.get('kuser1')
+    if kuser1 and kuser1 != SDEFAULT:
+        origindict['auth'] = kuser1
 
-    origindict = _cast_float(origindict, ['lat', 'lon', 'depth'])
-    origindict = _cast_int(origindict, ['evid', 'orid'])
-
-    return [origindict] or []
+    return _nonempty(origindict)
 
 
 def sachdr2event(header):
-    sac_event = [('nevid', 'evid'),
-                 ('kevnm', 'evname')]
+    eventdict = _pull(header, SAC_EVENT)
+
+    if eventdict['evid'] is not None:
+        eventdict['evid'] = int(eventdict['evid'])
 
-    eventdict = AttribDict()
-    for hdr, col in sac_event:
-        val = header.get(hdr, None)
-        eventdict[col] = val if val != SACDEFAULT[hdr] else None
+    return _nonempty(eventdict)
 
-    eventdict = _cast_int(eventdict, ['evid'])
 
-    return [eventdict] or []
+# SAC2000 pick header -> phase mappings
+PICK2PHASE = {'t0': 'P', 't1': 'Pn', 't2': 'Pg', 't3': 'S', 't4': 'Sn', 't5': 'Sg',
+              't6': 'Lg', 't7': 'LR', 't8': 'Rg', 't9': 'pP'}
+#
+# (pick time header, phase name header, default phase) for each pick
+PICKS = tuple((key, 'k' + key, phase) for key, phase in PICK2PHASE.items())
+
+
+def _get_picks(pickmap=None):
+    """
+    PICKS, with default phases overwritten or extended by a supplied pickmap.
+
+    """
+    if not pickmap:
+        return PICKS
+
+    # bulk conversions pass the same pickmap for every header
+    return _picks_for(tuple(pickmap.items()))
+
+
+@functools.lru_cache(maxsize=64)
+def _picks_for(pickitems):
+    pick2phase = dict(PICK2PHASE)
+    pick2phase.update(pickitems)
+
+    return tuple((key, 'k' + key, phase) for key, phase in pick2phase.items())
 
 
 def sachdr2assoc(header, pickmap=None):
@@ -612,154 +750,146 @@ def sachdr2assoc(header, pickmap=None):
             lastarid += 1
 
     """
-    pick2phase = {'t0': 'P', 't1': 'Pn', 't2': 'Pg', 't3': 'S',
-                  't4': 'Sn', 't5': 'Sg', 't6': 'Lg', 't7': 'LR', 't8': 'Rg',
-                  't9': 'pP'}
-
     # overwrite defaults with supplied map
-    if pickmap:
-        pick2phase.update(pickmap)
+    picks = _get_picks(pickmap)
 
     # geographic relations
     # obspy.read tries to calculate these values if lcalca is True and needed
     # header info is there, so we only need to try to if lcalca is False.
     # XXX: I just calculate it if no values are currently filled in.
-    sac_assoc = [('az', 'esaz'),
-                 ('baz', 'seaz'),
-                 ('gcarc', 'delta')]
-
-    assocdict = AttribDict()
-    for hdr, col in sac_assoc:
-        val = header.get(hdr, None)
-        assocdict[col] = val if val != SACDEFAULT[hdr] else None
-
-    # overwrite if any are None
-    if not assocdict:
-        try:
-            delta = geod.locations2degrees(header['stla'], header['stlo'],
-                                           header['evla'], header['evlo'])
-            m, seaz, esaz = geod.gps2dist_azimuth(header['stla'], header['stlo'],
-                                                 header['evla'], header['evlo'])
+    assocdict = _pull(header, SAC_ASSOC)
+
+    # overwrite if any are None, and the station and event locations are known
+    if None in assocdict.values():
+        stla, stlo, evla, evlo = (header.get(hdr) for hdr in ('stla', 'stlo', 'evla', 'evlo'))
+        if FDEFAULT not in (stla, stlo, evla, evlo) and None not in (stla, stlo, evla, evlo):
+            delta = geod.locations2degrees(stla, stlo, evla, evlo)
+            m, seaz, esaz = geod.gps2dist_azimuth(stla, stlo, evla, evlo)
             assocdict['esaz'] = esaz
             assocdict['seaz'] = seaz
             assocdict['delta'] = delta
-        except (ValueError, TypeError):
-            # some sac header values are None
-            pass
 
-    if header.get('kstnm', None):
-        assocdict['sta'] = header['kstnm']
+    kstnm = header.get('kstnm')
+    if kstnm and kstnm != SDEFAULT:
+        assocdict['sta'] = kstnm
 
-    orid = header.get('norid', None)
-    assocdict['orid'] = orid if orid != SACDEFAULT['norid'] else None
+    orid = header.get('norid')
+    assocdict['orid'] = orid if orid != IDEFAULT else None
 
     # now, do the phase arrival mappings
     # for each pick in hdr, make a separate dictionary containing assocdict plus
     # the new phase info.
+    get = header.get
     assocs = []
-    for key in pick2phase:
-        kkey = 'k' + key
+    for key, kkey, phase in picks:
         # if there's a value in t[0-9]
-        if header.get(key, None) not in (SACDEFAULT[key], None):
-            # if the phase name kt[0-9] is null
-            if header[kkey] == SACDEFAULT[kkey]:
-                # take it from the map
-                iassoc = {'phase': pick2phase[key]}
-            else:
-                # take it directly
-                iassoc = {'phase': header[kkey]}
+        tval = get(key)
+        if tval is None or tval == FDEFAULT:
+            continue
 
-            iassoc.update(assocdict)
-            assocs.append(iassoc)
+        # if the phase name kt[0-9] is null, take it from the map,
+        # otherwise take it directly, without SAC's padding
+        kval = get(kkey)
+        iassoc = {'phase': phase if kval is None or kval == SDEFAULT else kval.strip()}
+        iassoc.update(assocdict)
+        assocs.append(iassoc)
 
     return assocs
 
 
-def sachdr2arrival(header, pickmap=None):
+def _arrival_stachan(header):
+    arrivaldict = {}
+    kstnm = header.get('kstnm')
+    if kstnm is not None and kstnm != SDEFAULT:
+        arrivaldict['sta'] = kstnm
+    kcmpnm = header.get('kcmpnm')
+    if kcmpnm is not None and kcmpnm != SDEFAULT:
+        arrivaldict['chan'] = kcmpnm
+
+    return arrivaldict
+
+
+def sachdr2arrival(header, pickmap=None, reftime=None):
     """Similar to sachdr2assoc, but produces a list of up to 10 Arrival
     dictionaries.  Same header->phase mapping applies, unless otherwise stated.
+    The SAC reference time may be passed in as reftime, like sachdr2origin.
 
     """
     # puts t[0-9] times into arrival.time if they're not null
     # puts corresponding kt[0-9] phase name into arrival.iphase
     # if a kt[0-9] phase name is null and its t[0-9] values isn't,
     # phase names are pulled from the pick2phase dictionary
-    pick2phase = {'t0': 'P', 't1': 'Pn', 't2': 'Pg', 't3': 'S',
-                  't4': 'Sn', 't5': 'Sg', 't6': 'Lg', 't7': 'LR', 't8': 'Rg',
-                  't9': 'pP'}
-
-    if pickmap:
-        pick2phase.update(pickmap)
+    picks = _get_picks(pickmap)
 
     # simple translations
-    arrivaldict = AttribDict()
-    if header.get('kstnm', None) not in (SACDEFAULT['kstnm'], None):
-        arrivaldict['sta'] = header['kstnm']
-    if header.get('kcmpnm', None) not in (SACDEFAULT['kcmpnm'], None):
-        arrivaldict['chan'] = header['kcmpnm']
+    arrivaldict = _arrival_stachan(header)
 
     # phases and arrival times
-    t0 = get_sac_reftime(header)
+    # the reference time is only needed, and only looked up, if there are picks
+    t0 = reftime.timestamp if reftime is not None else None
+    get = header.get
     arrivals = []
-    for key in pick2phase:
-        kkey = 'k' + key
+    for key, kkey, phase in picks:
         # if there's a value in t[0-9]
-        if header.get('key', None) not in (SACDEFAULT[key], None):
-            # TODO: This seems broken...t isn't defined yet
-            itime = t + header[key]
-            iarrival = {'time': itime.timestamp,
-                        'jdate': int(itime.strftime('%Y%j'))}
-            # if the phase name kt[0-9] is null
-            if header[kkey] == SACDEFAULT[kkey]:
-                # take it from the pick2phase map
-                iarrival['iphase'] = pick2phase[key]
-            else:
-                # take it directly
-                iarrival['iphase'] = header[kkey]
-
-            iarrival.update(arrivaldict)
-            # TODO: wtf is iassoc??
-            arrivals.append(iassoc)
+        tval = get(key)
+        if tval is None or tval == FDEFAULT:
+            continue
+
+        if t0 is None:
+            t0 = get_sac_reftime(header).timestamp
+        itime = t0 + float(tval)
+
+        # if the phase name kt[0-9] is null, take it from the pick2phase map,
+        # otherwise take it directly, without SAC's padding
+        iphase = get(kkey)
+        if iphase is None or iphase == SDEFAULT:
+            iphase = phase
+        else:
+            iphase = iphase.strip()
+
+        iarrival = {'time': itime, 'jdate': _epoch_to_jdate(itime), 'iphase': iphase}
+        iarrival.update(arrivaldict)
+        arrivals.append(iarrival)
 
     return arrivals
 
 
-def sachdr2wfdisc(header):
+def sachdr2wfdisc(header, reftime=None):
     """Produce wfdisc kbcore table instance from sac header dictionary.
     Clearly this will be a skeleton instance, as the all-important 'dir' and
     'dfile' and 'datatype' must be filled in later.
+    The SAC reference time may be passed in as reftime, like sachdr2origin.
 
     """
-    t0 = get_sac_reftime(header)
-    b = header.get('b', None)
-    b = b if (b != SACDEFAULT['b']) else 0.0
-    starttime = t0 + b
-    e = header.get('e', None)
-    e = e if (e != SACDEFAULT['e']) else 0.0
-    endtime = t0 + e
-
-    wfdict = AttribDict()
-    wfdict['nsamp'] = int(header.get('npts', None))
-    wfdict['time'] = starttime.timestamp
-    wfdict['endtime'] = endtime.timestamp
-    wfdict['jdate'] = int(starttime.strftime('%Y%j'))
-
-    wfdict['samprate'] = int(round(1.0 / header['delta']))
-
-    kstnm = header.get('kstnm', None)
-    if kstnm not in (SACDEFAULT['kstnm'], None):
+    t0 = reftime if reftime is not None else get_sac_reftime(header)
+    b = header.get('b')
+    b = float(b) if (b != FDEFAULT) else 0.0
+    e = header.get('e')
+    e = float(e) if (e != FDEFAULT) else 0.0
+
+    # plain epoch seconds, instead of intermediate UTCDateTime instances
+    time = t0.timestamp + b
+
+    wfdict = {'nsamp': int(header.get('npts')),
+              'time': time,
+              'endtime': t0.timestamp + e,
+              'jdate': _epoch_to_jdate(time),
+              'samprate': int(round(1.0 / float(header['delta'])))}
+
+    kstnm = header.get('kstnm')
+    if kstnm is not None and kstnm != SDEFAULT:
         wfdict['sta'] = kstnm.strip()[:6]
 
-    kcmpnm = header.get('kcmpnm', None)
-    if kcmpnm not in (SACDEFAULT['kcmpnm'], None):
+    kcmpnm = header.get('kcmpnm')
+    if kcmpnm is not None and kcmpnm != SDEFAULT:
         wfdict['chan'] = kcmpnm.strip()[:8]
 
-    scale = header.get('scale', None)
-    if scale not in (SACDEFAULT['scale'], None):
+    scale = header.get('scale')
+    if scale is not None and scale != FDEFAULT:
         wfdict['calib'] = float(scale)
 
-    nwfid = header.get('nwfid', None)
-    if nwfid not in (SACDEFAULT['nwfid'], None):
+    nwfid = header.get('nwfid')
+    if nwfid is not None and nwfid != IDEFAULT:
         wfdict['wfid'] = nwfid
 
     wfdict['foff'] = 632
@@ -769,7 +899,40 @@ def sachdr2wfdisc(header):
     else:
         wfdict['datatype'] = 't4'
 
-    return [wfdict] or []
+    return [wfdict]
+
+
+# tables whose sachdr2* function uses the SAC reference time
+REFTIME_TABLES = frozenset(['arrival', 'origin', 'wfdisc'])
+
+# numeric headers used by the batched reference time and wfdisc conversions
+_NZ_HDRS = ('nzyear', 'nzjday', 'nzhour', 'nzmin', 'nzsec', 'nzmsec')
+_WFDISC_HDRS = _NZ_HDRS + ('npts', 'delta', 'b', 'e')
+
+
+# table name -> single-header scraping function
+SACHDR_TABLES = {'affiliation': sachdr2affiliation,
+                 'arrival': sachdr2arrival,
+                 'assoc': sachdr2assoc,
+                 'event': sachdr2event,
+                 'instrument': sachdr2instrument,
+                 'origin': sachdr2origin,
+                 'site': sachdr2site,
+                 'sitechan': sachdr2sitechan,
+                 'wfdisc': sachdr2wfdisc}
+
+
+def _plain_header(header):
+    """
+    The dict behind an ObsPy AttribDict header, like trace.stats.sac, so that
+    lookups skip AttribDict's Python-level __getitem__, and missing headers
+    don't raise and catch a KeyError in .get.  Other headers are returned as-is.
+
+    """
+    if isinstance(header, AttribDict) and not header.defaults:
+        return header.__dict__
+
+    return header
 
 
 def sachdr2tables(header, tables=None):
@@ -779,7 +942,7 @@ def sachdr2tables(header, tables=None):
     Parameters
     ----------
     header : dict
-        SAC header
+        SAC header, like an ObsPy trace.stats.sac
     tables : list/tuple of strings, optional
         Table name strings to return.
         Default, ['affiliation', 'arrival', 'assoc', 'event', 'instrument',
@@ -804,29 +967,43 @@ def sachdr2tables(header, tables=None):
     - wfdisc.dir, dfile, foff, datetype, wfid
 
     """
-    fns = {'affiliation': sachdr2affiliation,
-           'arrival': sachdr2arrival,
-           'assoc': sachdr2assoc,
-           'event': sachdr2event,
-           'instrument': sachdr2instrument,
-           'origin': sachdr2origin,
-           'site': sachdr2site,
-           'sitechan': sachdr2sitechan,
-           'wfdisc': sachdr2wfdisc}
-
     if tables is None:
-        tables = list(fns.keys())
+        tables = list(SACHDR_TABLES.keys())
+
+    header = _plain_header(header)
 
 #     for key in header:
 #         if key.startswith('k'):
 #             try:
 #                 header[key] = header[key].strip()[:6]
 
-    # t = AttribDict()
+    # the reference time is shared by the tables that need it
+    reftime = None
+    notime = False
+    if not REFTIME_TABLES.isdisjoint(tables):
+        try:
+            reftime = get_sac_reftime(header)
+        except KeyError:
+            # missing time headers.  wfdisc needs them, so it's skipped below
+            # instead of raising and catching the same KeyError again.
+            notime = True
+        except ValueError:
+            # each table function handles bad time headers its own way
+            pass
+
     t = {}
     for table in tables:
+        # names without a scraping function, like 'lastid', are skipped
+        # without raising and catching a KeyError
+        fn = SACHDR_TABLES.get(table)
+        if fn is None or (notime and table == 'wfdisc'):
+            continue
+
         try:
-            itab = fns[table](header)
+            if table in REFTIME_TABLES:
+                itab = fn(header, reftime=reftime)
+            else:
+                itab = fn(header)
         except KeyError:
             itab = []
 
@@ -838,8 +1015,328 @@ def sachdr2tables(header, tables=None):
     return t
 
 
+def _null_columns(headers, hdrmap, scales=None):
+    """
+    Gather the float headers in hdrmap from a list of SAC header dictionaries
+    into arrays, one per column, with missing or default values as nan.
+    Columns named in the optional scales dictionary are divided by their scale.
+
+    """
+    scales = scales or {}
+    hdrs = [hdr for hdr, col, default in hdrmap]
+    defaults = np.array([default for hdr, col, default in hdrmap], dtype=np.float64)
+    divisors = np.array([scales.get(col, 1.0) for hdr, col, default in hdrmap])
+
+    # all headers and columns in one array, so the null test and scaling
+    # are each a single operation
+    vals = np.array([[header.get(hdr) for hdr in hdrs] for header in headers],
+                    dtype=np.float64).reshape(len(headers), len(hdrs))
+    vals = np.where(vals == defaults, np.nan, vals / divisors)
+
+    return dict((col, vals[:, i]) for i, (hdr, col, default) in enumerate(hdrmap))
+
+
+def _str_column(headers, hdr, n):
+    """
+    Gather the stripped string header hdr, truncated to n characters, from a
+    list of SAC header dictionaries, with missing or default values as None.
+
+    """
+    vals = [header.get(hdr) for header in headers]
+
+    # clean each distinct value once, then every header is a single lookup,
+    # with null values already mapped to None
+    cleaned = {SACDEFAULT[hdr]: None, None: None}
+    for val in set(vals).difference(cleaned):
+        cleaned[val] = val.strip()[:n]
+
+    return [cleaned[val] for val in vals]
+
+
+def _rows(columns):
+    """
+    Turn a dictionary of equal-length columns into a list of row dictionaries.
+    nan values in NumPy columns become None.
+
+    """
+    names = list(columns.keys())
+    values = []
+    for col in columns.values():
+        if isinstance(col, np.ndarray):
+            isnull = np.isnan(col)
+            col = col.astype(object)
+            col[isnull] = None
+        values.append(col)
+
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def _picked_headers(headers):
+    """
+    The SAC header dictionaries that have at least one non-null pick time,
+    tested for all headers and picks at once.
+
+    """
+    picktimes = np.array([[header.get(key) for key, kkey, phase in PICKS]
+                          for header in headers], dtype=np.float64)
+    picked = ((picktimes != FDEFAULT) & ~np.isnan(picktimes)).any(axis=1)
+
+    return [header for header, ispicked in zip(headers, picked) if ispicked]
+
+
+def _sachdrs2picks(headers, table):
+    # headers without picks produce no assoc or arrival rows
+    rows = []
+    for header in _picked_headers(headers):
+        rows.extend(sachdr2tables(header, tables=[table]).get(table, []))
+
+    return rows
+
+
+def _sachdrs2site(headers):
+    columns = {'sta': _str_column(headers, 'kstnm', 6)}
+    columns.update(_null_columns(headers, SAC_SITE[1:], scales={'elev': 1000.0}))
+
+    return _rows(columns)
+
+
+def _sachdrs2sitechan(headers):
+    columns = {'sta': _str_column(headers, 'kstnm', 6),
+               'chan': _str_column(headers, 'kcmpnm', None)}
+    columns.update(_null_columns(headers, SAC_SITECHAN[2:], scales={'edepth': 1000.0}))
+
+    return _rows(columns)
+
+
+def _epoch_ns(nz):
+    """
+    Epoch nanoseconds from an (N, 6) integer array of SAC "nz" reference time
+    fields, like _reftime_ns for many headers at once.  Two-digit years must
+    already be taken as 19xx.
+
+    """
+    yr, jday, hour, minute, second, msec = nz.T
+    days = (yr - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+    seconds = (((days + jday - 1) * 24 + hour) * 60 + minute) * 60 + second
+
+    return (seconds * 1000 + msec) * 1000000
+
+
+def _epoch_to_jdates(timestamps):
+    """
+    Julian date integers from an array of epoch seconds, like _epoch_to_jdate.
+
+    """
+    days = np.floor_divide(timestamps, 86400).astype('datetime64[D]')
+    years = days.astype('datetime64[Y]')
+    doy = (days - years.astype('datetime64[D]')).astype(np.int64) + 1
+
+    return (years.astype(np.int64) + 1970) * 1000 + doy
+
+
+def _reftimes(nz):
+    """
+    SAC reference times in epoch seconds from an (N, 6) float array of "nz"
+    fields, like get_sac_reftime for many headers at once.
+
+    Also returns a boolean array of the rows with complete, valid fields in
+    years that int64 nanoseconds can hold.  The other rows are meant to be
+    scraped one header at a time, so they are omitted or raise as usual.
+
+    """
+    ok = np.isfinite(nz).all(axis=1)
+    nz = np.where(ok[:, np.newaxis], nz, 0).astype(np.int64)
+    yr = np.where((0 <= nz[:, 0]) & (nz[:, 0] <= 99), nz[:, 0] + 1900, nz[:, 0])
+    nz[:, 0] = yr
+    leap = (yr % 4 == 0) & ((yr % 100 != 0) | (yr % 400 == 0))
+    ok &= ((1678 <= yr) & (yr <= 2261) & (1 <= nz[:, 1]) & (nz[:, 1] <= 365 + leap)
+           & (0 <= nz[:, 2]) & (nz[:, 2] < 24) & (0 <= nz[:, 3]) & (nz[:, 3] < 60)
+           & (0 <= nz[:, 4]) & (nz[:, 4] < 60) & (0 <= nz[:, 5]) & (nz[:, 5] < 1000))
+
+    return _epoch_ns(nz) / 1e9, ok
+
+
+def _sachdrs2arrival(headers):
+    """
+    arrival rows for many SAC header dictionaries, with the pick times and
+    jdates for all headers and picks computed as NumPy arrays.
+
+    Headers with picks, but missing or invalid reference times, are scraped
+    by sachdr2tables, so they are omitted or raise as they would one at a time.
+
+    """
+    picktimes = np.array([[header.get(key) for key, kkey, phase in PICKS] for header in headers],
+                         dtype=np.float64).reshape(len(headers), len(PICKS))
+    picked = (picktimes != FDEFAULT) & ~np.isnan(picktimes)
+    nz = np.array([[header.get(hdr) for hdr in _NZ_HDRS] for header in headers],
+                  dtype=np.float64).reshape(len(headers), len(_NZ_HDRS))
+    t0, ok = _reftimes(nz)
+
+    # times and jdates of every pick at once, in header then pick order
+    ii, jj = np.nonzero(picked)
+    times = t0[ii] + picktimes[ii, jj]
+    jdates = np.zeros(len(times), dtype=np.int64)
+    good = ok[ii]
+    jdates[good] = _epoch_to_jdates(times[good])
+
+    # headers without picks produce no arrival rows
+    rows = []
+    last = None
+    ok = ok.tolist()
+    for i, j, itime, jdate in zip(ii.tolist(), jj.tolist(), times.tolist(), jdates.tolist()):
+        header = headers[i]
+        first = i != last
+        last = i
+        if not ok[i]:
+            if first:
+                rows.extend(sachdr2tables(header, tables=['arrival']).get('arrival', []))
+            continue
+        if first:
+            arrivaldict = _arrival_stachan(header)
+
+        key, kkey, phase = PICKS[j]
+        iphase = header.get(kkey)
+        if iphase is None or iphase == SDEFAULT:
+            iphase = phase
+        else:
+            iphase = iphase.strip()
+
+        iarrival = {'time': itime, 'jdate': jdate, 'iphase': iphase}
+        iarrival.update(arrivaldict)
+        rows.append(iarrival)
+
+    return rows
+
+
+def _sachdrs2wfdisc(headers):
+    """
+    wfdisc rows for many SAC header dictionaries, with the reference times,
+    start and end times, jdates and sample rates computed as NumPy arrays.
+
+    Headers with missing or invalid time, npts, delta, b, or e values are
+    scraped by sachdr2tables, so they are omitted or raise as they would
+    one at a time.
+
+    """
+    vals = np.array([[header.get(hdr) for hdr in _WFDISC_HDRS] for header in headers],
+                    dtype=np.float64).reshape(len(headers), len(_WFDISC_HDRS))
+    npts, delta, b, e = vals[:, 6], vals[:, 7], vals[:, 8], vals[:, 9]
+    b = np.where(b == FDEFAULT, 0.0, b)
+    e = np.where(e == FDEFAULT, 0.0, e)
+
+    # fields that would make _reftime_ns or sachdr2wfdisc raise, and years
+    # outside of int64 nanoseconds, are left to the single-header path
+    t0, ok = _reftimes(vals[:, :6])
+    ok &= np.isfinite(vals[:, 6:]).all(axis=1) & (delta != 0.0)
+    time = t0 + b
+    endtime = t0 + e
+    jdate = _epoch_to_jdates(np.where(ok, time, 0.0))
+    samprate = np.rint(1.0 / np.where(ok, delta, 1.0))
+
+    stas = _str_column(headers, 'kstnm', 6)
+    chans = _str_column(headers, 'kcmpnm', 8)
+    datatype = 'f4' if sys.byteorder == 'little' else 't4'
+
+    rows = []
+    for i, header in enumerate(headers):
+        if not ok[i]:
+            rows.extend(sachdr2tables(header, tables=['wfdisc']).get('wfdisc', []))
+            continue
+
+        wfdict = {'nsamp': int(npts[i]),
+                  'time': float(time[i]),
+                  'endtime': float(endtime[i]),
+                  'jdate': int(jdate[i]),
+                  'samprate': int(samprate[i])}
+        if stas[i] is not None:
+            wfdict['sta'] = stas[i]
+        if chans[i] is not None:
+            wfdict['chan'] = chans[i]
+
+        scale = header.get('scale')
+        if scale is not None and scale != FDEFAULT:
+            wfdict['calib'] = float(scale)
+
+        nwfid = header.get('nwfid')
+        if nwfid is not None and nwfid != IDEFAULT:
+            wfdict['wfid'] = nwfid
+
+        wfdict['foff'] = 632
+        wfdict['datatype'] = datatype
+        rows.append(wfdict)
+
+    return rows
+
+
+# tables with a columnar scraping function for many headers at once
+_BATCH_TABLES = {'arrival': _sachdrs2arrival,
+                 'assoc': functools.partial(_sachdrs2picks, table='assoc'),
+                 'site': _sachdrs2site,
+                 'sitechan': _sachdrs2sitechan,
+                 'wfdisc': _sachdrs2wfdisc}
+
+
+def sachdrs2tables(headers, tables=None):
+    """
+    Scrape many SAC header dictionaries into database table dictionaries.
+
+    Like sachdr2tables, but the numeric site and sitechan columns and the
+    wfdisc times are converted for all headers at once as NumPy arrays, and
+    headers without picks are skipped for assoc and arrival rows.  Other
+    tables are scraped one header at a time.
+
+    Parameters
+    ----------
+    headers : list of dict
+        SAC headers
+    tables : list/tuple of strings, optional
+        Table name strings to return.  Default is all tables from sachdr2tables.
+
+    Returns
+    -------
+    dict
+        Dictionary of lists of table dictionaries, in header order.  If no rows
+        are found for a table, it is omitted.
+
+    """
+    if tables is None:
+        tables = list(SACHDR_TABLES.keys())
+
+    headers = [_plain_header(header) for header in headers]
+    t = {}
+    if not headers:
+        return t
+
+    # remaining tables are scraped together for each header
+    othertables = [table for table in tables if table not in _BATCH_TABLES]
+    otherrows = dict((table, []) for table in othertables)
+    if othertables:
+        for header in headers:
+            for table, itab in sachdr2tables(header, tables=othertables).items():
+                otherrows[table].extend(itab)
+
+    for table in tables:
+        if table in _BATCH_TABLES:
+            itab = _BATCH_TABLES[table](headers)
+        else:
+            itab = otherrows[table]
+
+        if itab:
+            t[table] = itab
+
+    return t
+
+
 # ----------------- CONVERT TABLES TO SAC HEADER DICTIONARY ---------------#
 # TODO: make these functions able to gracefully handle None values as inputs
+_site2sachdr = _make_buildhdr({'stel': 'elev', 'stla': 'lat', 'stlo': 'lon',
+                               'user7': 'deast', 'user8': 'dnorth'})
+_sitechan2sachdr = _make_buildhdr({'cmpaz': 'hang', 'cmpinc': 'vang'})
+_affiliation2sachdr = _make_buildhdr({'knetwk': 'net'})
+_origin2sachdr = _make_buildhdr({'evdp': 'depth', 'evla': 'lat', 'evlo': 'lon', 'kuser1': 'auth',
+                                 'nevid': 'evid', 'norid': 'orid', 'user0': 'mb'})
+
+
 def site2sachdr(s):
     """
     Accepts a fielded site table row and returns a dictionary of corresponding
@@ -847,22 +1344,15 @@ def site2sachdr(s):
 
     June 13, 2016 - added deast/dnorth output to SAC user7/8 header fields
     """
-    keymap = {'stel': 'elev', 'stal': 'lat', 'stlo': 'lon',
-        'user7': 'deast', 'user8': 'dnorth'}
-    hdr = _buildhdr(keymap, s)
-    return hdr
+    return _site2sachdr(s)
 
 
 def sitechan2sachdr(sc):
-    keymap = {'cmpaz': 'hang', 'cmpinc': 'vang'}
-    hdr = _buildhdr(keymap, sc)
-    return hdr
+    return _sitechan2sachdr(sc)
 
 
 def affiliation2sachdr(af):
-    keymap = {'network': 'net'}
-    hdr = _buildhdr(keymap, af)
-    return hdr
+    return _affiliation2sachdr(af)
 
 
 def instrument2sachdr(ins):
@@ -874,10 +1364,7 @@ def origin2sachdr(o):
     Accepts a fielded origin table record and produces a dictionary of
     corresponding sac header field/value pairs.
     """
-    keymap = {'evdp': 'depth', 'evla': 'lat', 'evlo': 'lon', 'kuser1': 'auth',
-              'nevid': 'evid', 'norid': 'orid', 'user0': 'mb'}
-    hdr = _buildhdr(keymap, o)
-    return hdr
+    return _origin2sachdr(o)
 
 
 def event2sachdr(evt):
@@ -893,31 +1380,65 @@ def arrival2sachdr(ar):
 
 
 def wfdisc2sachdr(wf):
-    pass
+    return {}
 
 
 # functions that accept a table, return a dictionary of sac header values
-# the order of this dictionary matters
-KB2SAC = OrderedDict({'site': site2sachdr,
-                      'sitechan': sitechan2sachdr,
-                      'wfdisc': wfdisc2sachdr,
-                      'affiliation': affiliation2sachdr,
-                      'instrument': instrument2sachdr,
-                      'origin': origin2sachdr,
-                      'event': event2sachdr,
-                      'assoc': assoc2sachdr,
-                      'arrival': arrival2sachdr})
-
-
-def tables2sachdr(tables):
+# the order of this dictionary matters, and is kept by plain dicts
+KB2SAC = {'site': site2sachdr,
+          'sitechan': sitechan2sachdr,
+          'wfdisc': wfdisc2sachdr,
+          'affiliation': affiliation2sachdr,
+          'instrument': instrument2sachdr,
+          'origin': origin2sachdr,
+          'event': event2sachdr,
+          'assoc': assoc2sachdr,
+          'arrival': arrival2sachdr}
+
+
+# KB2SAC functions that don't produce any header values yet
+_EMPTY_KB2SAC = frozenset([instrument2sachdr, event2sachdr, assoc2sachdr, arrival2sachdr,
+                           wfdisc2sachdr])
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_tables2sachdr(items):
+    """
+    Generate the body of tables2sachdr for the (table, tabfun) items of KB2SAC,
+    with one hdr.update line per table instead of a loop over KB2SAC.  A new header is
+    built in one {**SACDEFAULT, **part, ...} display, instead of copying
+    SACDEFAULT and updating it once per table.  Functions in _EMPTY_KB2SAC
+    are left out, as they would only ever add nothing.
+
+    """
+    namespace = {'SACDEFAULT': SACDEFAULT}
+    calls = []
+    for i, (table, tabfun) in enumerate(items):
+        if tabfun in _EMPTY_KB2SAC:
+            continue
+        namespace['tabfun{}'.format(i)] = tabfun
+        calls.append("tabfun{}(tables.get({!r}))".format(i, table))
+
+    lines = ["def tables2sachdr(tables, hdr=None):",
+             "    if hdr is None:",
+             "        return {{**SACDEFAULT, {}}}".format(", ".join("**" + call for call in calls))]
+    lines.extend("    hdr.update({})".format(call) for call in calls)
+    lines.append("    return hdr")
+    exec("\n".join(lines) + "\n", namespace)
+
+    return namespace['tables2sachdr']
+
+
+def tables2sachdr(tables, hdr=None):
     """Returns a sac header dictionary, including default values, from
     current table instances.  SAC reference time is, in order of availability,
     origin time (origin.time), first sample time (wfdisc.time).
 
-    """
-
-    hdr = SACDEFAULT.copy()
-    for table, tabfun in KB2SAC.items():
-        hdr.update(tabfun(tables.get(table, None)))
+    If an existing header dictionary is provided as hdr, it is updated in place
+    and returned, instead of copying the SAC default header.  Use hdr={} to get
+    only the header values the tables provide, without the ~130 defaults, e.g.
+    for an ObsPy trace.stats.sac, where missing headers are already null.
 
-    return hdr
+    """
+    # generated once per KB2SAC contents, so changes to KB2SAC are used
+    return _compile_tables2sachdr(tuple(KB2SAC.items()))(tables, hdr)
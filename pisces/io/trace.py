@@ -5,15 +5,17 @@ Conversions between ObsPy Trace objects and table-like objects.
 import os
 from obspy.core import UTCDateTime, Trace, Stats
 from pisces.io.readwaveform import read_waveform
-from pisces.io.util import _buildhdr
+from pisces.io.util import _make_buildhdr
+
+
+_wfdisc2obspyhdr = _make_buildhdr({'npts': 'nsamp', 'calib': 'calib', 'channel': 'chan',
+                                    'sampling_rate': 'samprate', 'station': 'sta'})
 
 
 def wfdisc2obspyhdr(wf):
     """ ObsPy Stats dict from Wfdisc instance.
     """
-    keymap = {'npts': 'nsamp', 'calib': 'calib', 'channel': 'chan',
-              'sampling_rate': 'samprate', 'station': 'sta'}
-    obshdr = _buildhdr(keymap, wf)
+    obshdr = _wfdisc2obspyhdr(wf)
     obshdr['starttime'] = UTCDateTime(float(wf.time))
     obshdr['delta'] = 1. / wf.samprate
 
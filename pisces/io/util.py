@@ -5,6 +5,12 @@
 Common io utilities.
 
 """
+import functools
+import keyword
+from datetime import date
+
+# days from 0001-01-01 to the epoch, in proleptic Gregorian ordinals
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
 
 def _buildhdr(keymap, rec):
@@ -20,6 +26,10 @@ def _buildhdr(keymap, rec):
     # TODO: make keymap optional?
     # TODO: put this in io.util?
     hdr = {}
+    if rec is None:
+        # missing table, e.g. tables.get('origin')
+        return hdr
+
     for key1, key2 in keymap.items():
         try:
             hdr[key1] = getattr(rec, key2)
@@ -30,6 +40,42 @@ def _buildhdr(keymap, rec):
     return hdr
 
 
+def _make_buildhdr(keymap):
+    """
+    Make a function that does _buildhdr(keymap, rec) for a fixed keymap.
+
+    The function is generated once per keymap and builds the header as a
+    single dict literal of attribute lookups.  A None record gives an empty
+    header right away, and records that are missing any of the attributes
+    fall back to _buildhdr.
+
+    """
+    return _compile_buildhdr(tuple(keymap.items()))
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_buildhdr(items):
+    keymap = dict(items)
+    if not all(key2.isidentifier() and not keyword.iskeyword(key2) for key2 in keymap.values()):
+        return functools.partial(_buildhdr, keymap)
+
+    entries = ', '.join('{!r}: rec.{}'.format(key1, key2) for key1, key2 in items)
+    src = ("def buildhdr(rec):\n"
+           "    if rec is None:\n"
+           "        return {{}}\n"
+           "    try:\n"
+           "        return {{{}}}\n"
+           "    except AttributeError:\n"
+           "        return _buildhdr(keymap, rec)\n").format(entries)
+    namespace = {'_buildhdr': _buildhdr, 'keymap': keymap}
+    exec(src, namespace)
+
+    return namespace['buildhdr']
+
+
+_MISSING = object()
+
+
 def _map_header(keymap, dold, nulldict=None):
     """
     Returns a dictionary of values from dictionary dold,
@@ -49,27 +95,38 @@ def _map_header(keymap, dold, nulldict=None):
     Returns: dict
 
     """
-    # TODO: this confusing function should be rewritten  (using defaultdict?)
+    # one lookup per dictionary and key, with missing keys as _MISSING
+    # instead of raising and catching KeyError
+    get = dold.get
+    nullget = nulldict.get if nulldict else None
     dnew = {}
-    if nulldict:
-        for oldkey, newkey in keymap.items():
-            try:
-                if dold[oldkey] != nulldict[oldkey]:
-                    if isinstance(dold[oldkey], str):
-                        dnew[newkey] = dold[oldkey].strip()
-                    else:
-                        dnew[newkey] = dold[oldkey]
-            except KeyError:
-                # one of the dictionaries doesn't have a key
-                pass
-    else:
-        for oldkey, newkey in keymap.items():
-            try:
-                if isinstance(dold[oldkey], str):
-                    dnew[newkey] = dold[oldkey].strip()
-                else:
-                    dnew[newkey] = dold[oldkey]
-            except KeyError:
-                pass
+    for oldkey, newkey in keymap.items():
+        val = get(oldkey, _MISSING)
+        if val is _MISSING:
+            continue
+
+        if nullget is not None:
+            null = nullget(oldkey, _MISSING)
+            if null is _MISSING or val == null:
+                continue
+
+        dnew[newkey] = val.strip() if isinstance(val, str) else val
 
     return dnew
+
+
+def _epoch_to_jdate(timestamp):
+    """
+    Julian date integer, like 2002323, from epoch seconds, without formatting
+    a date string.  The per-day lookup is cached, which is faster than
+    time.gmtime and, unlike gmtime on some platforms, handles pre-1970 times.
+
+    """
+    return _epoch_day_to_jdate(int(timestamp // 86400))
+
+
+@functools.lru_cache(maxsize=4096)
+def _epoch_day_to_jdate(days):
+    day = date.fromordinal(EPOCH_ORDINAL + days)
+
+    return day.year * 1000 + day.toordinal() - date(day.year, 1, 1).toordinal() + 1
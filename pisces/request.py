@@ -2,18 +2,35 @@
 Convenience functions for building common queries.
 
 """
+import functools
+import itertools
+import math
+import sqlite3
+from collections import namedtuple
+
 import numpy as np
 from sqlalchemy import func, or_
 from obspy.core import UTCDateTime, Stream
 import obspy.geodetics as geod
 
+try:
+    from geographiclib.geodesic import Geodesic
+    GEOGRAPHICLIB_INSTALLED = True
+except ImportError:
+    GEOGRAPHICLIB_INSTALLED = False
+
 from pisces.io.trace import wfdisc2trace
-from pisces.util import make_wildcard_list
+from pisces.util import make_wildcard_list, string_expression
 
 import warnings
 
+# wfdisc columns needed to read a trace with wfdisc2trace
+_WFDISC_TRACE_COLUMNS = ('wfid', 'sta', 'chan', 'time', 'endtime', 'nsamp', 'samprate',
+                         'calib', 'datatype', 'dir', 'dfile', 'foff')
+
 def get_wfdisc_rows(session, wfdisc, sta=None, chan=None, t1=None, t2=None,
-                    wfids=None, daylong=False, asquery=False, verbose=False):
+                    wfids=None, daylong=False, asquery=False, verbose=False,
+                    stream=False, raw=False):
     """
     Returns a list of wfdisc records from provided SQLAlchemy ORM mapped
     wfdisc table, for given station, channel, and time window combination.
@@ -38,24 +55,35 @@ def get_wfdisc_rows(session, wfdisc, sta=None, chan=None, t1=None, t2=None,
         Useful if additional you desire additional sorting of filtering.
     verbose : bool, optional
         Print request to the stdout. Not used with asquery=True.
+    stream : bool, optional
+        Return an iterable that fetches rows from the database in batches as
+        it's consumed, instead of a list of all rows.  Default, False.
+        Not used with asquery=True.
+    raw : bool, optional
+        Query only the wfdisc columns needed by wfdisc2trace, and return plain
+        named rows instead of ORM instances.  Much faster for many rows, but
+        the rows can't be modified or used in the session.  Default, False.
 
     Returns
     -------
-    list of wfdisc row objects, or sqlalchemy.orm.Query instance
+    list or iterable of wfdisc row objects, or sqlalchemy.orm.Query instance
 
     """
     # seconds in a wfdisc file
     CHUNKSIZE = 24 * 60 * 60
-    q = session.query(wfdisc)
+    if raw:
+        q = session.query(*[getattr(wfdisc, col) for col in _WFDISC_TRACE_COLUMNS])
+    else:
+        q = session.query(wfdisc)
     if wfids is not None:
         q = q.filter(wfdisc.wfid.in_(wfids))
     else:
         if sta is not None:
             sta = make_wildcard_list(sta)
-            q = q.filter(or_(*[wfdisc.sta.like(stas) for stas in sta]))
+            q = q.filter(string_expression(wfdisc.sta, sta))
         if chan is not None:
             chan = make_wildcard_list(chan)
-            q = q.filter(or_(*[wfdisc.chan.like(chans) for chans in chan]))
+            q = q.filter(string_expression(wfdisc.chan, chan))
         if [t1, t2].count(None) == 0:
             q = q.filter(wfdisc.time.between(t1 - CHUNKSIZE, t2))
             q = q.filter(wfdisc.endtime > t1)
@@ -72,11 +100,34 @@ def get_wfdisc_rows(session, wfdisc, sta=None, chan=None, t1=None, t2=None,
         if verbose:
             msg = "Requesting sta={}, chan={}, time=[{}, {}], wfids={}"
             print(msg.format(sta, chan, UTCDateTime(t1), UTCDateTime(t2), wfids))
-        res = q.all()
+        if stream:
+            res = q.yield_per(1000)
+        else:
+            res = q.all()
 
     return res
 
 
+def _distaz(lat1, lon1, lat2, lon2):
+    """
+    Geodesic distance [m] and azimuth [deg] from point 1 to point 2 on WGS84.
+
+    Calls geographiclib directly when it's installed, skipping the per-call
+    overhead of obspy.geodetics.gps2dist_azimuth, which uses it underneath.
+
+    """
+    if not GEOGRAPHICLIB_INSTALLED:
+        return geod.gps2dist_azimuth(lat1, lon1, lat2, lon2)[:2]
+
+    result = Geodesic.WGS84.Inverse(lat1, lon1, lat2, lon2,
+                                    Geodesic.DISTANCE | Geodesic.AZIMUTH)
+    azimuth = result['azi1']
+    if azimuth < 0:
+        azimuth += 360
+
+    return result['s12'], azimuth
+
+
 def distaz_query(records, deg=None, km=None, swath=None):
     """
     Out-of-database subset based on distances and/or azimuths.
@@ -104,48 +155,121 @@ def distaz_query(records, deg=None, km=None, swath=None):
     #initial True array to propagate through multiple logical AND comparisons
     mask0 = np.ones(len(records), dtype=bool)
 
-    if deg:
-        dgen = (geod.locations2degrees(irec.lat, irec.lon, deg[0], deg[1]) \
-                for irec in records)
-        degrees = np.fromiter(dgen, dtype=float)
+    # distances are only computed for filters with a bound
+    if deg and (deg[2] is not None or deg[3] is not None):
+        # locations2degrees works on whole arrays of record coordinates
+        lats = np.fromiter((irec.lat for irec in records), dtype=float, count=len(records))
+        lons = np.fromiter((irec.lon for irec in records), dtype=float, count=len(records))
+        degrees = geod.locations2degrees(lats, lons, deg[0], deg[1])
         if deg[2] is not None:
-            mask0 = np.logical_and(mask0, deg[2] <= degrees)
+            mask0 &= deg[2] <= degrees
         if deg[3] is not None:
-            mask0 = np.logical_and(mask0, deg[3] >= degrees)
+            mask0 &= deg[3] >= degrees
 
-        #mask0 = np.logical_and(mask0, mask)
-
-    if km:
+    center = None
+    if km and (km[2] is not None or km[3] is not None):
         #???: this may be backwards
-        mgen = (geod.gps2dist_azimuth(irec.lat, irec.lon, km[0], km[1])[0] \
-                  for irec in records)
-        kilometers = np.fromiter(mgen, dtype=float)/1e3
-        #meters, azs, bazs = zip(*valgen)
-        #kilometers = np.array(meters)/1e3
+        center = (km[0], km[1])
+        distazs = [_distaz(irec.lat, irec.lon, km[0], km[1]) for irec in records]
+        kilometers = np.fromiter((m for m, az in distazs), dtype=float,
+                                 count=len(distazs))/1e3
         if km[2] is not None:
-            mask0 = np.logical_and(mask0, km[2] <= kilometers)
+            mask0 &= km[2] <= kilometers
         if km[3] is not None:
-            mask0 = np.logical_and(mask0, km[3] >= kilometers)
-
-        #mask0 = np.logical_and(mask0, mask)
+            mask0 &= km[3] >= kilometers
 
     if swath is not None:
         minaz = swath[2] - swath[3]
         maxaz = swath[2] + swath[3]
-        #???: this may be backwards
-        azgen = (geod.gps2dist_azimuth(irec.lat, irec.lon, km[0], km[1])[1] \
-                 for irec in records)
-        azimuths = np.fromiter(azgen, dtype=float)
-        mask0 = np.logical_and(mask0, azimuths >= minaz)
-        mask0 = np.logical_and(mask0, azimuths <= maxaz)
+        # the km distances already came with azimuths from the same center
+        if center != (swath[0], swath[1]):
+            #???: this may be backwards
+            distazs = [_distaz(irec.lat, irec.lon, swath[0], swath[1]) for irec in records]
+        azimuths = np.fromiter((az for m, az in distazs), dtype=float, count=len(distazs))
+        mask0 &= azimuths >= minaz
+        mask0 &= azimuths <= maxaz
 
-    #idx = np.nonzero(np.atleast_1d(mask0))[0] ???
-    idx = np.nonzero(mask0)[0]
-    recs = [records[i] for i in idx]
+    recs = list(itertools.compress(records, mask0))
 
     return recs
 
 
+# dialects with the SIN and COS functions used for in-database distance filters
+_TRIG_DIALECTS = ('oracle', 'postgresql', 'mysql', 'mssql')
+
+
+@functools.lru_cache(maxsize=None)
+def _sqlite_has_trig():
+    # SQLite only has SIN and COS when it's built with its math functions
+    try:
+        sqlite3.connect(':memory:').execute('SELECT sin(0), cos(0)')
+    except sqlite3.OperationalError:
+        return False
+
+    return True
+
+
+def _cos_distance(table, lat, lon):
+    """
+    SQL expression for the cosine of the spherical great-circle distance
+    between table.lat, table.lon and a lat, lon point in degrees.
+
+    """
+    d2r = math.pi / 180
+    return (func.sin(table.lat * d2r) * math.sin(lat * d2r) +
+            func.cos(table.lat * d2r) * math.cos(lat * d2r) * func.cos((table.lon - lon) * d2r))
+
+
+def distance_prefilter(q, table, deg=None, km=None):
+    """
+    In-database prefilter for distaz_query's deg and km distance ranges.
+
+    Compares the cosine of the spherical great-circle distance from the center,
+    with ranges widened so no rows that distaz_query keeps are dropped.  Rows
+    must still go through distaz_query for exact distances.  Databases
+    without SIN and COS functions get the query back unchanged.
+
+    Parameters
+    ----------
+    q : sqlalchemy.orm.Query instance
+    table : mapped table class with lat, lon columns
+    deg, km : list or tuple of numbers, optional
+        (centerlat, centerlon, minr, maxr), like distaz_query.
+
+    Returns
+    -------
+    sqlalchemy.orm.Query instance
+
+    """
+    bind = q.session.bind
+    dialect = bind.dialect.name if bind is not None else None
+    if not (dialect in _TRIG_DIALECTS or (dialect == 'sqlite' and _sqlite_has_trig())):
+        return q
+
+    ranges = []
+    if deg:
+        # same sphere as locations2degrees, so just a little for rounding
+        ranges.append((deg[0], deg[1],
+                       deg[2] - 0.01 if deg[2] is not None else None,
+                       deg[3] + 0.01 if deg[3] is not None else None))
+    if km:
+        # geodesic km are within 1% of km on the sphere
+        ranges.append((km[0], km[1],
+                       geod.kilometers2degrees(0.99 * km[2]) - 0.01 if km[2] is not None else None,
+                       geod.kilometers2degrees(1.01 * km[3]) + 0.01 if km[3] is not None else None))
+
+    for lat, lon, minr, maxr in ranges:
+        # cosine decreases from 0 to 180 degrees, so the bounds swap, and
+        # ranges reaching either end aren't filtered, in case of rounding
+        cosdist = _cos_distance(table, lat, lon)
+        if minr is not None and minr > 0:
+            q = q.filter(cosdist <= math.cos(math.radians(minr)))
+        if maxr is not None and maxr < 180:
+            q = q.filter(cosdist >= math.cos(math.radians(maxr)))
+
+    return q
+
+
 def geographic_query(q, table, region=None, depth=None, asquery=False):
     """
     Filter by region (W, E, S, N) [deg] and/or depth range (min, max) [km].
@@ -288,6 +412,7 @@ def get_events(session, origin, event=None, region=None, deg=None, km=None,
     if asquery:
         res = q
     else:
+        q = distance_prefilter(q, Origin, deg=deg, km=km)
         res = distaz_query(q.all(), deg=deg, km=km, swath=swath)
 
     return res
@@ -343,9 +468,10 @@ def get_stations(session, site, sitechan=None, affiliation=None, stations=None,
     Each parameter produces an AND clause, list parameters produce IN 
     clauses, a regex produces a REGEXP_LIKE clause (Oracle-specific?).
 
-    deg, km, and swath are evaluated out-of-database by evaluating all other 
-    flags first, then masking.  This can be memory-intensive.  See "Examples"
-    for how to perform in-database distance filters.
+    deg and km are roughly prefiltered in-database, where the database has
+    SIN and COS functions, then evaluated exactly out-of-database along with
+    swath by masking.  See "Examples" for how to perform your own in-database
+    distance filters.
     
     To include channels or networks with your results use asquery=True, and
 
@@ -374,17 +500,17 @@ def get_stations(session, site, sitechan=None, affiliation=None, stations=None,
     
     if stations:
         stations = make_wildcard_list(stations)
-        q = q.filter(or_(*[Site.sta.like(stas) for stas in stations]))
+        q = q.filter(string_expression(Site.sta, stations))
         
     if nets:
         nets = make_wildcard_list(nets)
         q = q.join(Affiliation, Affiliation.sta==Site.sta)
-        q = q.filter(or_(*[Affiliation.net.like(net) for net in nets]))
+        q = q.filter(string_expression(Affiliation.net, nets))
 
     if channels:
         channels = make_wildcard_list(channels)
         q = q.join(Sitechan, Sitechan.sta==Site.sta)
-        q = q.filter(or_(*[Sitechan.chan.like(chans) for chans in channels]))
+        q = q.filter(string_expression(Sitechan.chan, channels))
 
     if time_span:
         start_date, end_date = time_span  # start and end days of time period to get stations from
@@ -398,6 +524,7 @@ def get_stations(session, site, sitechan=None, affiliation=None, stations=None,
     if asquery:
         res = q
     else:
+        q = distance_prefilter(q, Site, deg=deg, km=km)
         res = distaz_query(q.all(), deg=deg, km=km, swath=swath)
 
     return res
@@ -448,15 +575,15 @@ def get_arrivals(session, arrival, assoc=None, stations=None, channels=None,
 
     if stations:
         stations = make_wildcard_list(stations)
-        q = q.filter(or_(*[Arrival.sta.like(stas) for stas in stations]))
+        q = q.filter(string_expression(Arrival.sta, stations))
 
     if channels:
         channels = make_wildcard_list(channels)
-        q = q.filter(or_(*[Arrival.chan.like(chans) for chans in channels]))
+        q = q.filter(string_expression(Arrival.chan, channels))
 
     if phases:
         phases = make_wildcard_list(phases)
-        q = q.filter(or_(*[Arrival.iphase.like(phase) for phase in phases]))
+        q = q.filter(string_expression(Arrival.iphase, phases))
 
     if t:
         if t.count(None) == 0:
@@ -476,7 +603,7 @@ def get_arrivals(session, arrival, assoc=None, stations=None, channels=None,
 
     if auth:
         auth = make_wildcard_list(auth)
-        q = q.filter(or_(*[Arrival.auth.like(author) for author in auth]))
+        q = q.filter(string_expression(Arrival.auth, auth))
 
     if asquery:
         res = q
@@ -531,8 +658,10 @@ def get_waveforms(session, wfdisc, station=None, channel=None, starttime=None,
     t1_utc = UTCDateTime(starttime) if starttime is not None else None
     t2_utc = UTCDateTime(endtime) if endtime is not None else None
 
+    # rows are streamed, so traces are read while later rows are fetched, and
+    # only the columns needed for the traces are fetched
     wfs = get_wfdisc_rows(session, Wfdisc, station, channel, starttime, endtime,
-                          wfids=wfids, asquery=asquery)
+                          wfids=wfids, asquery=asquery, stream=True, raw=not asquery)
 
     if asquery:
         res = wfs
@@ -542,6 +671,12 @@ def get_waveforms(session, wfdisc, station=None, channel=None, starttime=None,
     return res
     
 
+# wfdisc columns that determine the trace read by wfdisc2trace
+_TRACE_KEY_COLUMNS = ('sta', 'chan', 'time', 'nsamp', 'samprate', 'calib', 'datatype',
+                      'dir', 'dfile', 'foff')
+_TraceKey = namedtuple('_TraceKey', _TRACE_KEY_COLUMNS)
+
+
 def wfdisc_rows_to_stream(wf_rows, start_t, end_t, tol=None):
     """
     Convert wfdisc rows to obspy stream, trim the data to starttime and endtime 
@@ -550,7 +685,8 @@ def wfdisc_rows_to_stream(wf_rows, start_t, end_t, tol=None):
     Parameters
     ----------
     wf_rows : 
-        Wfdisc rows as generated by get_wfdisc_rows or similar
+        Wfdisc rows as generated by get_wfdisc_rows or similar.
+        Any iterable of rows, which is only iterated once.
     start_t: UTCDateTime
         Requested start time of the returned traces
     end_t: UTCDateTime
@@ -570,25 +706,39 @@ def wfdisc_rows_to_stream(wf_rows, start_t, end_t, tol=None):
         Returned Stream contains trace start/end times outside of the tolerance.
     """
     st = Stream()
+    # earliest start and latest end of the traces read
+    min_t = max_t = None
+    # untrimmed traces read in this call, by the wfdisc values they're read from
+    traces = {}
     
     for wf in wf_rows:
-        try:
-            tr = wfdisc2trace(wf)
-        except IOError:
-            # can't read file
-            # XXX: wow, why the hell would I let unreadable traces slip past
-            tr = None
+        key = _TraceKey(*[getattr(wf, col) for col in _TRACE_KEY_COLUMNS])
+        reused = key in traces
+        if reused:
+            tr = traces[key]
+        else:
+            try:
+                tr = wfdisc2trace(key)
+            except IOError:
+                # can't read file
+                # XXX: wow, why the hell would I let unreadable traces slip past
+                tr = None
+            traces[key] = tr
 
         if tr:
             # None utc times will pass through
-            tr.trim(start_t, end_t)
+            tr = tr.slice(start_t, end_t)
+            if reused:
+                # so traces in the stream don't share data
+                tr = tr.copy()
             st.append(tr)
+            if min_t is None or tr.stats.starttime < min_t:
+                min_t = tr.stats.starttime
+            if max_t is None or tr.stats.endtime > max_t:
+                max_t = tr.stats.endtime
             # TODO: do arrival stuff here?
 
-    if all([tol, start_t, end_t]):
-        start_t, end_t = zip(*[(tr.stats.start_t, tr.stats.end_t) for tr in st])
-        min_t = float(min(start_t))
-        max_t = float(max(end_t))
+    if all([tol, start_t, end_t]) and st:
         if (abs(min_t - start_t) > tol) or (abs(max_t - end_t) > tol):
             msg = "Trace times are outside of tolerance: {} seconds".format(tol)
             # XXX: change this to a real Pisces exception
@@ -711,13 +861,13 @@ def query_network(session, network, nets=None, affiliation=None, stas=None, time
 
     if nets:
         nets = make_wildcard_list(nets)
-        q = q.filter(or_(*[network.net.like(net) for net in nets]))
+        q = q.filter(string_expression(network.net, nets))
 
     if stas:
         if not affiliation:
             raise NameError('Affiliation table required to filter Network table from station list')
         stas = make_wildcard_list(stas)
-        q = q.filter(or_(*[affiliation.sta.like(sta) for sta in stas]))
+        q = q.filter(string_expression(affiliation.sta, stas))
 
     if time_:
         if not affiliation:
@@ -809,13 +959,13 @@ def query_site(session, site, sitechan=None, stas=None, chans=None, time_=None,
 
     if stas:
         stas = make_wildcard_list(stas)
-        q = q.filter(or_(*[site.sta.like(sta) for sta in stas]))
+        q = q.filter(string_expression(site.sta, stas))
 
     if chans:
         if not sitechan:
             raise NameError('Sitechan table required to filter site table by channels')
-        stations = make_wildcard_list(chans)
-        q = q.filter(or_(*[sitechan.chan.like(chan) for chan in chans]))
+        chans = make_wildcard_list(chans)
+        q = q.filter(string_expression(sitechan.chan, chans))
 
     if time_:
         jultime_ = int(time_.strftime('%Y%j'))
@@ -892,11 +1042,11 @@ def query_responses(session, sensor, instrument = None, stas = None, chans = Non
 
     if stas:
         stas = make_wildcard_list(stas)
-        q = q.filter(or_(*[sensor.sta.like(sta) for sta in stas]))
+        q = q.filter(string_expression(sensor.sta, stas))
 
     if chans:
         chans = make_wildcard_list(chans)
-        q = q.filter(or_(*[sensor.chan.like(chan) for chan in chans]))
+        q = q.filter(string_expression(sensor.chan, chans))
 
     if time_:
         q = q.filter(time_.timestamp < sensor.endtime)
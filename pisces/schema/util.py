@@ -9,14 +9,6 @@ from collections import namedtuple
 
 import sqlalchemy as sa
 from sqlalchemy.orm import DeclarativeMeta, declarative_base
-try:
-    from sqlalchemy.orm.decl_base import _declarative_constructor
-except ModuleNotFoundError:
-    # 1.3 to 0.8
-    from sqlalchemy.ext.declarative.api import _declarative_constructor
-except ImportError:
-    # not >0.8
-    from sqlalchemy.ext.declarative import _declarative_constructor
 
 # NO SELF IMPORTS!
 
@@ -141,6 +133,24 @@ def string_formatter(meta, structure):
 # -------- Methods for PiscesMeta --------
 
 
+def _column_defaults(cls):
+    """
+    (attribute name, info default, default is callable) for each column of a
+    mapped class, in column order.  Made on first use and kept on the class,
+    so that deferred reflection has already filled in the columns.
+
+    """
+    defaults = cls.__dict__.get('_column_defaults')
+    if defaults is None:
+        defaults = []
+        for c in cls.__table__.columns:
+            dflt = c.info.get('default', None)
+            defaults.append((cls._attrname[c.name], dflt, hasattr(dflt, '__call__')))
+        cls._column_defaults = defaults
+
+    return defaults
+
+
 def _init(self, *args, **kwargs):
     """
     Create a mapped table instance (a row).
@@ -153,9 +163,6 @@ def _init(self, *args, **kwargs):
     # Given to the metaclass to become the __init__ for the class, which means things in it are
     # done to the instances (self).
 
-    # this method is a hot mess:
-    # TODO: cache hidden properties line _positions, _types, _defaults, ...
-    #    in get_tables?  --> No, put this in PiscesMeta.__init__
     # XXX: fails if no column.info dictionary (schema=Base.metadata wasn't
     #   supplied).
     # XXX: perhaps None was the intended value
@@ -163,36 +170,32 @@ def _init(self, *args, **kwargs):
 
     # XXX: fails for attribute name different from column name (e.g. 'yield_' vs 'yield')
     # use self.__mapper__.columns['yield_'].name to get attr-column mapping
-    # TODO: I think it want this snippet to be in PiscesMeta.__new__
-    # self._attrname = {c.name: a for a,c in self.__mapper__.c.items()} #{col_name: attr_name}
-    # self._strfmt = string_formatter(self.__base__.metadata, [self.__table__.name])
+    cls = type(self)
+    defaults = _column_defaults(cls)
     if args:
         # positional value instantiation
         if kwargs:
             raise ValueError("Either positional or keyword arguments accepted.")
-        if len(args) != len(self.__table__.columns):
+        if len(args) != len(defaults):
             raise ValueError("Provide a position argument for each column.")
-        for c, ival in zip(self.__table__.columns, args):
-            dflt = c.info.get('default', None)
-            if ival is None:
-                if hasattr(dflt, '__call__'):
-                    # handle callables, like datetime.datetime.now
-                    setattr(self, self._attrname[c.name], dflt())
-                else:
-                    setattr(self, self._attrname[c.name], dflt)
-            else:
-                setattr(self, self._attrname[c.name], ival)
+        values = args
     else:
         # keyword value instantiation
-        # use SQLA's keyword constructor, then replace None attribute values with defaults
-        _declarative_constructor(self, **kwargs)
-        for c, ival in [(col, getattr(self, self._attrname[col.name], None)) for col in self.__table__.columns]:
-            dflt = c.info.get('default', None)
-            if ival is None:
-                if hasattr(dflt, '__call__'):
-                    setattr(self, self._attrname[c.name], dflt())
-                else:
-                    setattr(self, self._attrname[c.name], dflt)
+        # keywords are checked like SQLA's keyword constructor, but each column
+        # attribute is set only once, to its value or its default
+        for key, val in kwargs.items():
+            if not hasattr(cls, key):
+                raise TypeError("%r is an invalid keyword argument for %s" % (key, cls.__name__))
+        values = [kwargs.pop(attr, None) for attr, dflt, iscallable in defaults]
+        # remaining keywords aren't columns, like relationships
+        for key, val in kwargs.items():
+            setattr(self, key, val)
+
+    for (attr, dflt, iscallable), ival in zip(defaults, values):
+        if ival is None:
+            # handle callables, like datetime.datetime.now
+            ival = dflt() if iscallable else dflt
+        setattr(self, attr, ival)
 
 
 def _str(self):
@@ -22,7 +22,6 @@ from sqlalchemy.orm.exc import UnmappedInstanceError
 
 import obspy.geodetics as geod
 from obspy.core import AttribDict
-from obspy.taup import TauPyModel
 
 from pisces.schema.util import PiscesMeta
 
@@ -395,7 +394,20 @@ def gen_id(i=0):
         i += 1
         yield i
 
-ak135 = TauPyModel(model='ak135')
+@functools.lru_cache(maxsize=None)
+def _ak135():
+    # obspy.taup and its model are slow to load, so it's done on first use
+    from obspy.taup import TauPyModel
+
+    return TauPyModel(model='ak135')
+
+
+def __getattr__(name):
+    # the ak135 model is still available as pisces.util.ak135
+    if name == 'ak135':
+        return _ak135()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
 
 def travel_times(ref, deg=None, km=None, depth=0.):
     """
@@ -443,7 +455,7 @@ def travel_times(ref, deg=None, km=None, depth=0.):
             if not tt:
                 if not deg:
                     deg = geod.kilometer2degrees(km)
-                tt = ak135.get_travel_times(depth, deg)
+                tt = _ak135().get_travel_times(depth, deg)
             try:
                 idx = [ph.name for ph in tt].index(iref)
                 itt = [ph.time for ph in tt][idx]
@@ -814,7 +826,7 @@ def string_expression(selectable, string_filters):
     >>> channels = ['%Z', 'B_N', 'HHT']
     >>> chan_expr = string_expression(Wfdisc.chan, channels)
     >>> literal_sql(session.bind, chan_expr) # just shows the literal compiled SQL
-    "wfdisc.chan LIKE '%Z' OR wfdisc.chan LIKE 'B_N' OR wfdisc.chan = 'HHT'"
+    "wfdisc.chan = 'HHT' OR wfdisc.chan LIKE '%Z' OR wfdisc.chan LIKE 'B_N'"
     >>> wfdisc_rows = session.query(Wfdisc).filter(chan_expr).all()
 
 """
@@ -829,12 +841,19 @@ def string_expression(selectable, string_filters):
             expression = selectable == string_filter
     else:
         # use OR (for wildcards) or IN
-        if any([has_sql_wildcards(string_filter) for string_filter in string_filters]):
-            # can't use IN, must use LIKE with OR
-            # produces query.filter(or_(selectable.like(thing1), selectable == thing2, ...))
-            clauses = [selectable.like(string_filter) if has_sql_wildcards(string_filter)
-                       else selectable == string_filter
-                       for string_filter in string_filters]
+        wildcards = [string_filter for string_filter in string_filters
+                     if has_sql_wildcards(string_filter)]
+        if wildcards:
+            # literals share one EQUAL or IN, wildcards each need a LIKE
+            # produces query.filter(or_(selectable.in_([thing2, thing3]), selectable.like(thing1), ...))
+            literals = [string_filter for string_filter in string_filters
+                        if not has_sql_wildcards(string_filter)]
+            clauses = []
+            if len(literals) == 1:
+                clauses.append(selectable == literals[0])
+            elif literals:
+                clauses.append(selectable.in_(literals))
+            clauses.extend(selectable.like(wildcard) for wildcard in wildcards)
             expression = sa.or_(*clauses)
         else:
             # no wildcards, can just use in_
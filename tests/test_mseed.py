@@ -0,0 +1,40 @@
+"""
+Test functions in pisces.io.mseed
+
+"""
+import numpy as np
+from obspy import Trace, UTCDateTime
+
+from pisces.io.mseed import mseedhdr2tables
+from pisces.tables.kbcore import Wfdisc
+
+
+def _stats():
+    tr = Trace(np.zeros(100, dtype=np.int32))
+    tr.stats.network = 'XX'
+    tr.stats.station = 'STA'
+    tr.stats.channel = 'BHZ'
+    tr.stats.sampling_rate = 40.0
+    tr.stats.starttime = UTCDateTime(2020, 12, 31, 23, 59, 59)
+
+    return tr.stats
+
+
+def test_mseedhdr2tables_dicts():
+    stats = _stats()
+    rows = mseedhdr2tables(stats)
+
+    wfdisc, = rows['wfdisc']
+    assert (wfdisc['sta'], wfdisc['chan'], wfdisc['datatype']) == ('STA', 'BHZ', 'sd')
+    assert (wfdisc['nsamp'], wfdisc['samprate'], wfdisc['jdate']) == (100, 40.0, 2020366)
+    assert wfdisc['endtime'] == stats.endtime.timestamp
+    assert rows['affiliation'] == [{'net': 'XX', 'sta': 'STA'}]
+
+
+def test_mseedhdr2tables_classes():
+    rows = mseedhdr2tables(_stats(), wfdisc=Wfdisc)
+
+    wfdisc, = rows['wfdisc']
+    assert isinstance(wfdisc, Wfdisc)
+    assert (wfdisc.nsamp, wfdisc.samprate) == (100, 40.0)
+    assert rows['site'] == [{'sta': 'STA'}]
@@ -0,0 +1,156 @@
+"""
+Test functions in pisces.request
+
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+import obspy.geodetics as geod
+from obspy import UTCDateTime
+
+import pisces.request as request
+from pisces.request import distaz_query, get_stations, get_waveforms, get_wfdisc_rows
+from pisces.tables.kbcore import Site, Wfdisc
+
+
+def _records():
+    return [SimpleNamespace(lat=lat, lon=lon)
+            for lat in range(-80, 90, 20) for lon in range(-170, 180, 40)]
+
+
+def test_distaz_query_deg():
+    records = _records()
+    recs = distaz_query(records, deg=(35.0, -106.0, 20.0, 60.0))
+
+    # same records, in the same order, as testing one record at a time
+    expected = [rec for rec in records
+                if 20.0 <= geod.locations2degrees(rec.lat, rec.lon, 35.0, -106.0) <= 60.0]
+    assert recs == expected
+    assert distaz_query([], deg=(35.0, -106.0, None, 60.0)) == []
+
+
+def test_distaz_query_km_swath():
+    records = _records()
+    recs = distaz_query(records, km=(35.0, -106.0, None, 5000.0), swath=(35.0, -106.0, 90.0, 45.0))
+
+    def distaz(rec, lat, lon):
+        return geod.gps2dist_azimuth(rec.lat, rec.lon, lat, lon)[:2]
+
+    expected = [rec for rec in records if distaz(rec, 35.0, -106.0)[0] <= 5e6
+                and 45.0 <= distaz(rec, 35.0, -106.0)[1] <= 135.0]
+    assert recs and recs == expected
+
+    # a swath on its own uses its own center
+    expected = [rec for rec in records if 45.0 <= distaz(rec, 0.0, 0.0)[1] <= 135.0]
+    assert distaz_query(records, swath=(0.0, 0.0, 90.0, 45.0)) == expected
+
+
+
+def _site_session():
+    engine = sa.create_engine('sqlite://')
+    Site.__table__.create(engine)
+    session = Session(engine)
+    session.add_all([Site(sta='S{}'.format(i), ondate=2000001, lat=rec.lat, lon=rec.lon)
+                     for i, rec in enumerate(_records())])
+    session.commit()
+
+    return session
+
+
+_DISTANCES = [dict(deg=(35.0, -106.0, 20.0, 60.0)), dict(km=(35.0, -106.0, None, 5000.0)),
+              dict(km=(-90.0, 0.0, 2000.0, None))]
+
+
+def test_get_stations_distance():
+    session = _site_session()
+
+    # the in-database prefilter doesn't change the exact results
+    for kwargs in _DISTANCES:
+        expected = distaz_query(session.query(Site).all(), **kwargs)
+        assert get_stations(session, Site, **kwargs) == expected
+        # SQLite only filters in-database with its math functions
+        if request._sqlite_has_trig():
+            assert request.distance_prefilter(session.query(Site), Site, **kwargs).count() < len(_records())
+    session.close()
+
+
+def test_get_stations_distance_no_trig(monkeypatch):
+    session = _site_session()
+    monkeypatch.setattr(request, '_sqlite_has_trig', lambda: False)
+
+    # without SIN and COS, the query is unchanged and filtered out-of-database
+    for kwargs in _DISTANCES:
+        q = session.query(Site)
+        assert request.distance_prefilter(q, Site, **kwargs) is q
+        assert get_stations(session, Site, **kwargs) == distaz_query(q.all(), **kwargs)
+    session.close()
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = sa.create_engine('sqlite://')
+    Wfdisc.__table__.create(engine)
+    session = Session(engine)
+
+    data = np.arange(100, dtype='>i4')
+    data.tofile(str(tmp_path / 'STA.w'))
+    for wfid, sta in enumerate(['STA', 'STB'], start=1):
+        session.add(Wfdisc(sta=sta, chan='BHZ', time=0.0, endtime=9.9, wfid=wfid, nsamp=100,
+                           samprate=10.0, datatype='s4', dir=str(tmp_path), dfile='STA.w', foff=0))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_get_wfdisc_rows_stream(session):
+    wfs = get_wfdisc_rows(session, Wfdisc, sta='ST*', t1=1.0, t2=2.0, stream=True)
+
+    # rows are fetched as they're iterated
+    assert not isinstance(wfs, list)
+    assert [wf.wfid for wf in wfs] == [1, 2]
+
+
+def test_get_wfdisc_rows_raw(session):
+    wfs = get_wfdisc_rows(session, Wfdisc, wfids=[2], raw=True)
+    wf, = get_wfdisc_rows(session, Wfdisc, wfids=[2])
+
+    # plain rows with the same trace columns as the ORM instances
+    assert not isinstance(wfs[0], Wfdisc)
+    assert (wfs[0].sta, wfs[0].dfile, wfs[0].nsamp) == (wf.sta, wf.dfile, wf.nsamp)
+
+
+def test_get_waveforms_tol(session):
+    st = get_waveforms(session, Wfdisc, station='STA', starttime=1.0, endtime=2.0, tol=0.5)
+    assert len(st) == 1
+    assert st[0].data.tolist() == list(range(10, 21))
+
+    # traces end before the requested endtime
+    with pytest.raises(ValueError):
+        get_waveforms(session, Wfdisc, station='STA', starttime=1.0, endtime=12.0, tol=0.5)
+
+
+def test_wfdisc_rows_to_stream_repeated_rows(session, monkeypatch):
+    reads = []
+    wfdisc2trace = request.wfdisc2trace
+    monkeypatch.setattr(request, 'wfdisc2trace', lambda wf: reads.append(wf) or wfdisc2trace(wf))
+
+    # both rows point at the same samples, which are read once
+    wf, = get_wfdisc_rows(session, Wfdisc, wfids=[1])
+    session.add(Wfdisc(sta=wf.sta, chan=wf.chan, time=wf.time, endtime=wf.endtime, wfid=3,
+                       nsamp=wf.nsamp, samprate=wf.samprate, datatype=wf.datatype, dir=wf.dir,
+                       dfile=wf.dfile, foff=wf.foff))
+    wfs = get_wfdisc_rows(session, Wfdisc, sta='STA')
+    st = request.wfdisc_rows_to_stream(wfs, UTCDateTime(1.0), UTCDateTime(2.0))
+    assert len(reads) == 1
+    assert [tr.data.tolist() for tr in st] == [list(range(10, 21))] * 2
+
+    # the traces don't share data
+    st[0].data[0] = -1
+    assert st[1].data[0] == 10
+
+    # nothing is kept after the call
+    request.wfdisc_rows_to_stream(wfs, UTCDateTime(1.0), UTCDateTime(2.0))
+    assert len(reads) == 2
@@ -0,0 +1,98 @@
+"""
+Test functions in pisces.io.response
+
+"""
+import os
+
+from obspy import UTCDateTime, read_inventory
+from obspy.core.inventory.response import (Response, InstrumentSensitivity,
+                                           CoefficientsTypeResponseStage,
+                                           CoefficientWithUncertainties,
+                                           PolesZerosResponseStage)
+
+from pisces.io.response import sxml2pazfir, write_pazfir
+
+
+def _iir_response():
+    numerator = [CoefficientWithUncertainties(1.0)]
+    denominator = [CoefficientWithUncertainties(1.0),
+                   CoefficientWithUncertainties(-0.5, lower_uncertainty=0.1,
+                                                upper_uncertainty=0.2)]
+    stage = CoefficientsTypeResponseStage(1, 1.0, 1.0, 'V', 'COUNTS', 'DIGITAL',
+                                          numerator=numerator, denominator=denominator,
+                                          decimation_input_sample_rate=40.0,
+                                          decimation_factor=1, decimation_offset=0,
+                                          decimation_delay=0.0, decimation_correction=0.0)
+    sensitivity = InstrumentSensitivity(1.0, 1.0, 'V', 'COUNTS')
+
+    return Response(instrument_sensitivity=sensitivity, response_stages=[stage])
+
+
+def _data_lines(path):
+    with open(path) as f:
+        return [line for line in f if not line.startswith('#')]
+
+
+def test_write_pazfir_iir_denominator_errors(tmp_path):
+    _, _, fileName = write_pazfir(_iir_response(), 'STA', 'BHZ', UTCDateTime(2020, 1, 1),
+                                  dir_path=str(tmp_path))
+    assert fileName.endswith('.2020001.iir')
+
+    lines = _data_lines(os.path.join(str(tmp_path), fileName))
+    # denominator errors come from each denominator coefficient
+    assert lines[5].split() == ['1.000000e+00', '0.000000e+00']
+    assert lines[6].split() == ['-5.000000e-01', '2.000000e-01']
+
+
+def test_write_pazfir_paz_header_zeros(tmp_path):
+    stage = PolesZerosResponseStage(1, 1.0, 1.0, 'M/S', 'V', 'LAPLACE (RADIANS/SECOND)', 1.0,
+                                    [0j], [-1 + 1j, -1 - 1j], normalization_factor=1.0)
+    response = Response(instrument_sensitivity=InstrumentSensitivity(1.0, 1.0, 'M/S', 'V'),
+                        response_stages=[stage])
+
+    # the velocity stage is written with an extra zero, in the header and the
+    # body, without changing the stage, so writing it again gives the same file
+    texts = []
+    for year in (2020, 2021):
+        _, _, fileName = write_pazfir(response, 'STA', 'BHZ', UTCDateTime(year, 1, 1),
+                                      out_freq=1.0, dir_path=str(tmp_path))
+        with open(os.path.join(str(tmp_path), fileName)) as f:
+            text = f.read()
+        texts.append([line for line in text.splitlines() if 'Number of Zeros' in line])
+        assert _data_lines(os.path.join(str(tmp_path), fileName))[5].split() == ['2']
+    assert texts == [['#\tNumber of Zeros: 2']] * 2
+    assert len(stage.zeros) == 1
+
+
+def test_sxml2pazfir_return_tables(tmp_path):
+    kept, streamed = tmp_path / 'kept', tmp_path / 'streamed'
+    kept.mkdir()
+    streamed.mkdir()
+    sensor, instrument = sxml2pazfir(read_inventory(), dir_path=str(kept))
+
+    # rows are only written to the table files, and the files are the same
+    assert sxml2pazfir(read_inventory(), dir_path=str(streamed), return_tables=False) == (None, None)
+    with open(str(kept / 'sensor_table.txt')) as f1, open(str(streamed / 'sensor_table.txt')) as f2:
+        lines = f2.readlines()
+        assert f1.readlines() == lines
+    assert len(lines) == len(sensor['sta'])
+
+
+def test_sxml2pazfir_max_workers(tmp_path):
+    serial, pooled = tmp_path / 'serial', tmp_path / 'pooled'
+    serial.mkdir()
+    pooled.mkdir()
+    tables = sxml2pazfir(read_inventory(), dir_path=str(serial))
+    pooledTables = sxml2pazfir(read_inventory(), dir_path=str(pooled), max_workers=2)
+
+    # the same files, with results lined up with channels that have a response
+    fileNames = sorted(os.listdir(str(serial)))
+    assert fileNames == sorted(os.listdir(str(pooled)))
+    for fileName in fileNames:
+        with open(str(serial / fileName)) as f1, open(str(pooled / fileName)) as f2:
+            assert f1.read().replace(str(serial), '') == f2.read().replace(str(pooled), '')
+
+    for table, pooledTable in zip(tables, pooledTables):
+        table.pop('dir', None)
+        pooledTable.pop('dir', None)
+        assert table == pooledTable
@@ -0,0 +1,167 @@
+"""
+Test functions in pisces.io.sac
+
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from obspy import Trace, read
+from obspy.core import AttribDict
+
+import pisces.io.sac as sac
+
+
+def _header(**kwargs):
+    header = {'kstnm': 'STA     ', 'kcmpnm': 'BHZ     ', 'stla': 35.0, 'stlo': -106.0,
+              'stel': sac.FDEFAULT, 'cmpaz': 0.0, 'cmpinc': 0.0, 'stdp': 12.0}
+    header.update(kwargs)
+
+    return header
+
+
+def test_sachdrs2tables():
+    headers = [_header(), _header(kstnm='STA2    ', stel=1500.0, stla=sac.FDEFAULT)]
+    tables = sac.sachdrs2tables(headers, tables=['site', 'sitechan'])
+
+    # batched rows match the rows from scraping one header at a time
+    for table in ('site', 'sitechan'):
+        expected = [dict(sac.sachdr2tables(header, tables=[table])[table][0]) for header in headers]
+        assert tables[table] == expected
+
+    assert tables['site'][1] == {'sta': 'STA2', 'lat': None, 'lon': -106.0, 'elev': 1.5}
+
+    # ObsPy's trace.stats.sac headers give the same rows
+    attribdicts = [AttribDict(header) for header in headers]
+    assert sac.sachdrs2tables(attribdicts, tables=['site', 'sitechan']) == tables
+    assert sac.sachdr2tables(attribdicts[0]) == sac.sachdr2tables(headers[0])
+
+
+def test_sachdr2arrival():
+    header = _header(nzyear=2020, nzjday=1, nzhour=0, nzmin=0, nzsec=0, nzmsec=0,
+                     t0=np.float32(1.5), kt0=sac.SDEFAULT, t1=sac.FDEFAULT, kt1=sac.SDEFAULT)
+    arrivals = sac.sachdr2arrival(header)
+
+    assert len(arrivals) == 1
+    # float32 pick times don't reduce the epoch time to float32
+    assert isinstance(arrivals[0]['time'], float)
+    assert arrivals[0]['time'] == 1577836801.5
+    assert arrivals[0]['jdate'] == 2020001
+    assert arrivals[0]['iphase'] == 'P'
+
+
+def test_sachdrs2tables_arrival():
+    times = dict(nzyear=2020, nzjday=1, nzhour=0, nzmin=0, nzsec=0, nzmsec=0)
+    headers = [_header(t0=np.float32(1.5), kt0=sac.SDEFAULT, t3=10.0, kt3='Sn      ', **times),
+               _header(t0=sac.FDEFAULT, **times),
+               _header(t1=2.5, kt1=sac.SDEFAULT),
+               _header(t9=-3.0, kt9=sac.SDEFAULT, **dict(times, nzyear=2300))]
+    arrivals = sac.sachdrs2tables(headers, tables=['arrival'])['arrival']
+
+    # batched rows match the rows from scraping one header at a time, and
+    # picks without a reference time are omitted
+    assert arrivals == [row for header in headers
+                        for row in sac.sachdr2tables(header, tables=['arrival']).get('arrival', [])]
+    assert [arrival['iphase'] for arrival in arrivals] == ['P', 'Sn', 'pP']
+    assert isinstance(arrivals[0]['time'], float)
+
+
+def test_sachdr2tables_omits_empty_tables():
+    header = _header(kuser1=sac.SDEFAULT)
+    tables = sac.sachdr2tables(header, tables=['event', 'origin', 'site', 'wfdisc'])
+
+    # no event or origin headers are set, including the default kuser1 string,
+    # and no time headers are set for wfdisc
+    assert list(tables.keys()) == ['site']
+
+
+def test_sachdr2origin_etype():
+    header = _header(evla=36.0, evlo=-106.0, ievtyp=38, imagtyp=52, mag=4.5, imagsrc=61)
+    origin, = sac.sachdr2origin(header)
+
+    assert (origin['etype'], origin['mb'], origin['auth']) == ('ex', 4.5, 'PDE')
+
+
+def test_tables2sachdr_site():
+    site = SimpleNamespace(lat=35.0, lon=-106.0, elev=1.5, deast=0.0, dnorth=0.0)
+    hdr = sac.tables2sachdr({'site': site})
+
+    assert (hdr['stla'], hdr['stlo'], hdr['stel']) == (35.0, -106.0, 1.5)
+    assert 'stal' not in hdr
+
+    # only the values from the tables
+    assert sac.tables2sachdr({'site': site}, hdr={}) == {'stla': 35.0, 'stlo': -106.0, 'stel': 1.5,
+                                                        'user7': 0.0, 'user8': 0.0}
+
+
+def test_tables2sachdr_kb2sac(monkeypatch):
+    # changes to KB2SAC are used
+    monkeypatch.setitem(sac.KB2SAC, 'lastid', lambda lastid: {'kuser0': 'ID      '} if lastid else {})
+    assert sac.tables2sachdr({'lastid': 1}, hdr={}) == {'kuser0': 'ID      '}
+    monkeypatch.undo()
+    assert sac.tables2sachdr({'lastid': 1}, hdr={}) == {}
+
+
+def test_sachdr2assoc_geodetic_fallback():
+    header = _header(evla=36.0, evlo=-106.0, norid=1, t0=1.5, kt0=sac.SDEFAULT)
+    assocs = sac.sachdr2assoc(header)
+
+    # az, baz, gcarc aren't in the header, so they come from the locations
+    assert len(assocs) == 1
+    assert abs(assocs[0]['delta'] - 1.0) < 0.01
+    assert (assocs[0]['seaz'], assocs[0]['esaz']) == (0.0, 180.0)
+
+
+def test_sachdrs2tables_wfdisc():
+    times = dict(nzyear=2020, nzjday=366, nzhour=23, nzmin=59, nzsec=59, nzmsec=999,
+                 npts=100, delta=np.float32(0.025), b=np.float32(-1.25), e=sac.FDEFAULT)
+    headers = [_header(**times), _header(**dict(times, nzyear=78, nzjday=365, b=sac.FDEFAULT)),
+               _header(**dict(times, nzjday=367))]
+    wfdiscs = sac.sachdrs2tables(headers[:2], tables=['wfdisc'])['wfdisc']
+
+    # batched rows match the rows from scraping one header at a time
+    assert wfdiscs == [sac.sachdr2tables(header, tables=['wfdisc'])['wfdisc'][0]
+                       for header in headers[:2]]
+    assert wfdiscs[0]['jdate'] == 2020366
+    assert wfdiscs[1]['jdate'] == 1978365
+
+    # invalid reference times raise like they do one header at a time
+    with pytest.raises(ValueError):
+        sac.sachdrs2tables(headers, tables=['wfdisc'])
+
+
+@pytest.mark.parametrize('byteorder', ['<', '>'])
+def test_parse_sac_binary_header(tmp_path, byteorder):
+    tr = Trace(np.arange(10, dtype=np.float32))
+    tr.stats.station = 'STA'
+    filename = str(tmp_path / 'test.sac')
+    tr.write(filename, format='SAC', byteorder=byteorder)
+
+    with open(filename, 'rb') as f:
+        buf = f.read(sac.SAC_HEADER_SIZE)
+    header = sac.parse_sac_binary_header(buf)
+    assert sac.get_sac_byteorder(buf) == byteorder
+
+    # same names and values as ObsPy's full header
+    expected = dict(read(filename, debug_headers=True)[0].stats.sac)
+    assert header == expected
+    assert header['kstnm'] == 'STA     '
+
+
+def test_parse_sac_binary_header_strings(tmp_path):
+    tr = Trace(np.arange(10, dtype=np.float32))
+    filename = str(tmp_path / 'test.sac')
+    tr.write(filename, format='SAC', byteorder='<')
+
+    # null-terminated station and a default kt0 with junk after the null
+    with open(filename, 'r+b') as f:
+        buf = bytearray(f.read())
+        buf[440:448] = b'AB\x00CD\x00\x00\x00'
+        buf[488:496] = b'-12345\x00x'
+        f.seek(0)
+        f.write(buf)
+
+    header = sac.parse_sac_binary_header(buf)
+    expected = dict(read(filename, debug_headers=True)[0].stats.sac)
+    assert header == expected
+    assert (header['kstnm'], header['kt0']) == ('AB   ', sac.SDEFAULT)
@@ -147,4 +147,18 @@ class TestPiscesMeta:
         assert Sitechan.__table__.name == 'sitechan'
         assert JSitechan.__tablename__ == 'sitechan'
         assert JSitechan.__table__.name == 'sitechan'
-        assert JSitechan.__table__.schema == 'testuser'
\ No newline at end of file
+        assert JSitechan.__table__.schema == 'testuser'
+
+    def test_init_defaults(self):
+        """ Missing and None column values become their info defaults. """
+        from pisces.tables.kbcore import Site
+
+        site = Site(sta='STA', lat=None)
+        assert (site.sta, site.lat, site.ondate) == ('STA', -999.0, -1)
+        assert site.lddate is not None
+
+        site = Site(*[None] * len(Site.__table__.columns))
+        assert (site.sta, site.lat) == ('-', -999.0)
+
+        with pytest.raises(TypeError):
+            Site(bogus=1)
@@ -59,6 +59,13 @@ def test_string_expressions():
     expected = sa.or_(Sitechan.chan == 'BHZ', Sitechan.chan.like('LH%'))
     assert str(expression) == str(expected)
 
+    # literals share one IN however they're mixed with wildcards
+    channels = ['LH%', 'BHZ', 'B_N', 'BHE']
+    expression = util.string_expression(Sitechan.chan, channels)
+    expected = sa.or_(Sitechan.chan.in_(['BHZ', 'BHE']), Sitechan.chan.like('LH%'),
+                      Sitechan.chan.like('B_N'))
+    assert str(expression) == str(expected)
+
 
 def test_load_config_file():
     CFG = """